@@ -0,0 +1,353 @@
+"""Benchmarks de carga, filtrado, búsqueda y preparación de imágenes.
+
+Genera tablas sintéticas de Modelos/llantas/Valvulas/Rines/Equipos_Mina a
+escala 1x, 10x y 100x (1x es del tamaño del catálogo actual) e imágenes
+sintéticas, y mide los mismos caminos que recorre main.py:
+
+- carga de las tablas desde CSV, desde el snapshot Parquet y, si se indica
+  --mysql, desde un MySQL local a través de GestorConexion,
+- tipado de las tablas (esquema.py) y la memoria que ocupan antes y después,
+- construcción de la vista agrupada (groupby + merge) y de los índices,
+- filtros de la pestaña de modelos y búsqueda por texto,
+- búsqueda por llanta (texto y selección de la lista),
+- consultas de mostrar_detalles,
+- matriz de compatibilidad para 1000 códigos CAI,
+- preparación de miniaturas (en frío, desde disco y desde memoria).
+
+El resultado es JSON para poder comparar entre commits:
+
+    python benchmark.py --escalas 1 10 --salida bench.json
+    python benchmark.py --escalas 1 10 --comparar bench.json
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+from PIL import Image
+
+from conexion import TABLAS, GestorConexion
+from compatibilidad import matriz_compatibilidad
+from detalles import IndiceDetalles
+from esquema import memoria, tipar_tabla
+from indice_llantas import IndiceLlantas
+from miniaturas import ALTURA_TARJETA, CacheMiniaturas
+from snapshot import cargar_snapshot, guardar_snapshot
+from vista_catalogo import VistaCatalogo, agrupar_llantas
+
+# Tamaño de cada tabla a escala 1x
+FILAS_BASE = {
+    'Modelos': 176,
+    'llantas': 450,
+    'Valvulas': 350,
+    'Rines': 350,
+    'Equipos_Mina': 700,
+}
+
+# Archivo CSV de respaldo de cada tabla, igual que en main.py
+ARCHIVOS_CSV = {
+    'Modelos': 'modelos.csv',
+    'llantas': 'llantas.csv',
+    'Valvulas': 'valvulas.csv',
+    'Rines': 'rines.csv',
+    'Equipos_Mina': 'equipos_mina.csv',
+}
+
+FABRICANTES = ['CAT', 'KOM', 'SVK', 'EPI', 'ATL', 'VOL', 'LET', 'JCB', 'CAS', 'NOR', 'MTI', 'TAL']
+TIPOS = ['Camión', 'Cargador', 'Tractor', 'Motoniveladora', 'Scoop', 'Jumbo']
+MINAS = ['Peñasquito', 'Buenavista', 'Media Luna', 'La Caridad', 'Fresnillo', 'Saucito', 'Cozamin',
+         'San Julián', 'Herradura', 'Tayahua', 'El Cubo', 'Las Chispas']
+RINES = [25, 29, 33, 35, 49, 51, 57, 63]
+
+# Imágenes sintéticas a escala 1x
+IMAGENES_BASE = 24
+
+# Regresión que --comparar marca como significativa
+TOLERANCIA_REGRESION = 0.20
+
+
+def generar_datos(escala, semilla=0):
+    """Tablas sintéticas con la forma de las reales, a la escala indicada."""
+    rng = random.Random(semilla)
+    n_modelos = FILAS_BASE['Modelos'] * escala
+
+    fabricantes = [rng.choice(FABRICANTES) for _ in range(n_modelos)]
+    descripciones = [f"{fab} {rng.choice('RLTS')}{i:0{len(str(n_modelos))}d}{rng.choice(['', 'G', 'H', 'K'])}"
+                     for i, fab in enumerate(fabricantes)]
+    modelos = pd.DataFrame({
+        'Equipment Description': descripciones,
+        'Fabricante': fabricantes,
+        'Tipo': [rng.choice(TIPOS) for _ in range(n_modelos)],
+        'Imagen': [f"img_{i % (IMAGENES_BASE * escala)}.jpg" for i in range(n_modelos)],
+    })
+
+    def equipos(n):
+        return [rng.choice(descripciones) for _ in range(n)]
+
+    n = FILAS_BASE['llantas'] * escala
+    llantas = pd.DataFrame({
+        'Equipment Description': equipos(n),
+        'Desc Michelin': [f"{rng.randint(10, 59)}.00R{rng.choice(RINES)} XDR{rng.randint(1, 4)}"
+                          if rng.random() < 0.8 else None for _ in range(n)],
+        'Desc MAXAM': [f"{rng.randint(10, 59)}.00R{rng.choice(RINES)} MS{rng.randint(100, 999)}"
+                       if rng.random() < 0.7 else None for _ in range(n)],
+        'CAI': [rng.randint(100000, 999999) for _ in range(n)],
+        'MAXAM': [rng.randint(10000, 99999) if rng.random() < 0.7 else None for _ in range(n)],
+    })
+
+    n = FILAS_BASE['Valvulas'] * escala
+    valvulas = pd.DataFrame({
+        'Equipment Description': equipos(n),
+        'Marca Valvula': [rng.choice(['Schrader', 'Topline', 'Haltec']) for _ in range(n)],
+        'Componente': [rng.choice(['Válvula', 'Extensión', 'Tapón']) for _ in range(n)],
+        'Nombre KT': [f"VAL-{rng.randint(1, 500)}" for _ in range(n)],
+        'Codigo KT': [f"KTV{i:07d}" for i in range(n)],
+    })
+
+    n = FILAS_BASE['Rines'] * escala
+    rines = pd.DataFrame({
+        'Equipment Description': equipos(n),
+        'Marca Rin': [rng.choice(['Titan', 'GKN', 'Trinity']) for _ in range(n)],
+        'Componentes': [rng.choice(['Rin', 'Aro', 'Base', 'Seguro']) for _ in range(n)],
+        'Descripcion Sugerida': [f"RIN {rng.choice(RINES)}-{rng.randint(10, 40)}.00/5.0" for _ in range(n)],
+        'Codigo KT': [f"KTR{i:07d}" for i in range(n)],
+    })
+
+    n = FILAS_BASE['Equipos_Mina'] * escala
+    equipos_mina = pd.DataFrame({
+        'Equipment Description': equipos(n),
+        'Mina': [rng.choice(MINAS) for _ in range(n)],
+        'No Equipos': [rng.randint(1, 40) for _ in range(n)],
+    })
+
+    return dict(zip(TABLAS, [modelos, llantas, valvulas, rines, equipos_mina]))
+
+
+def generar_imagenes(directorio, cantidad, semilla=0):
+    """Imágenes JPEG sintéticas de tamaños parecidos a las del catálogo."""
+    rng = np.random.default_rng(semilla)
+    os.makedirs(directorio, exist_ok=True)
+    for i in range(cantidad):
+        ancho, alto = int(rng.integers(800, 1600)), int(rng.integers(600, 1200))
+        # Ruido de baja resolución escalado: cuesta decodificar como una foto real
+        base = rng.integers(0, 256, size=(alto // 16, ancho // 16, 3), dtype=np.uint8)
+        Image.fromarray(base).resize((ancho, alto)).save(os.path.join(directorio, f"img_{i}.jpg"), quality=90)
+
+
+def medir(funcion, repeticiones):
+    """Ejecuta funcion `repeticiones` veces y devuelve tiempos en milisegundos."""
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        funcion()
+        tiempos.append((time.perf_counter() - inicio) * 1000)
+    return {
+        'min_ms': round(min(tiempos), 4),
+        'mediana_ms': round(statistics.median(tiempos), 4),
+        'media_ms': round(statistics.fmean(tiempos), 4),
+        'repeticiones': repeticiones,
+    }
+
+
+def cargar_csv(directorio):
+    return [pd.read_csv(os.path.join(directorio, ARCHIVOS_CSV[tabla])) for tabla in TABLAS]
+
+
+def preparar_mysql(gestor, tablas):
+    """Crea las tablas sintéticas en el MySQL de prueba."""
+    with gestor.conexion() as conn:
+        cursor = conn.cursor()
+        for tabla, df in tablas.items():
+            columnas = ', '.join(f"`{c}` TEXT" for c in df.columns)
+            cursor.execute(f"DROP TABLE IF EXISTS {tabla}")
+            cursor.execute(f"CREATE TABLE {tabla} ({columnas})")
+            marcadores = ', '.join(['%s'] * len(df.columns))
+            nombres = ', '.join(f"`{c}`" for c in df.columns)
+            filas = [tuple(None if pd.isna(v) else str(v) for v in fila) for fila in df.itertuples(index=False)]
+            cursor.executemany(f"INSERT INTO {tabla} ({nombres}) VALUES ({marcadores})", filas)
+        conn.commit()
+        cursor.close()
+
+
+def benchmark_escala(escala, directorio, repeticiones, config_mysql=None, semilla=0):
+    """Todas las mediciones para una escala; devuelve un diccionario de resultados."""
+    resultados = {}
+    tablas = generar_datos(escala, semilla)
+    rng = random.Random(semilla)
+
+    # Carga de datos
+    directorio_csv = os.path.join(directorio, 'csv')
+    os.makedirs(directorio_csv, exist_ok=True)
+    for tabla, df in tablas.items():
+        df.to_csv(os.path.join(directorio_csv, ARCHIVOS_CSV[tabla]), index=False)
+    resultados['carga_csv'] = medir(lambda: cargar_csv(directorio_csv), repeticiones)
+
+    directorio_snapshot = os.path.join(directorio, 'snapshot')
+    resultados['guardar_snapshot'] = medir(lambda: guardar_snapshot(tablas, directorio=directorio_snapshot), repeticiones)
+    resultados['carga_snapshot'] = medir(lambda: cargar_snapshot(directorio_snapshot), repeticiones)
+
+    if config_mysql is not None:
+        gestor = GestorConexion(config_mysql)
+        preparar_mysql(gestor, tablas)
+        resultados['carga_mysql'] = medir(gestor.cargar_tablas, repeticiones)
+        gestor.cerrar()
+
+    # Tipado de las tablas como las publica el sincronizador, partiendo de
+    # columnas object como las que devuelve el cursor de la base de datos
+    sin_tipar = {tabla: df.astype(object) for tabla, df in zip(TABLAS, cargar_csv(directorio_csv))}
+    resultados['tipar_tablas'] = medir(
+        lambda: {tabla: tipar_tabla(tabla, df) for tabla, df in sin_tipar.items()}, repeticiones)
+    tablas = {tabla: tipar_tabla(tabla, df) for tabla, df in sin_tipar.items()}
+    bytes_tablas = {
+        'sin_tipar': {tabla: memoria(df) for tabla, df in sin_tipar.items()},
+        'tipadas': {tabla: memoria(df) for tabla, df in tablas.items()},
+    }
+
+    # Vista agrupada e índices
+    df_modelos, df_llantas = tablas['Modelos'], tablas['llantas']
+    resultados['agrupar_llantas'] = medir(lambda: agrupar_llantas(df_llantas), repeticiones)
+    resultados['vista_catalogo'] = medir(lambda: VistaCatalogo(df_modelos, df_llantas), repeticiones)
+    vista = VistaCatalogo(df_modelos, df_llantas)
+
+    # Filtros y búsqueda de la pestaña de modelos
+    consultas = [d[:len(d) - 2] for d in rng.sample(list(df_modelos['Equipment Description']), 5)]
+    resultados['filtro_tipo_fabricante'] = medir(
+        lambda: vista.filtrar(tipo=TIPOS[0], fabricante=FABRICANTES[0]), repeticiones)
+    resultados['busqueda_modelos'] = medir(
+        lambda: [vista.filtrar(consulta=q) for q in consultas], repeticiones)
+
+    # Búsqueda por llanta
+    resultados['indice_llantas'] = medir(lambda: IndiceLlantas(df_llantas), repeticiones)
+    indice_llantas = IndiceLlantas(df_llantas)
+    etiquetas = rng.sample(indice_llantas.etiquetas(), min(5, len(indice_llantas.etiquetas())))
+    resultados['busqueda_llantas_texto'] = medir(
+        lambda: [indice_llantas.buscar(q) for q in ['xdr', '00r57', 'ms5', '35', 'r63 xdr2']], repeticiones)
+    resultados['busqueda_llantas_lista'] = medir(
+        lambda: [indice_llantas.equipos_por_opcion(e) for e in etiquetas], repeticiones)
+
+    # Detalles del equipo
+    resultados['indice_detalles'] = medir(
+        lambda: IndiceDetalles(vista.catalogo, tablas['Valvulas'], tablas['Rines'], tablas['Equipos_Mina']),
+        repeticiones)
+    indice_detalles = IndiceDetalles(vista.catalogo, tablas['Valvulas'], tablas['Rines'], tablas['Equipos_Mina'])
+    equipos = rng.sample(list(df_modelos['Equipment Description']), 20)
+    resultados['mostrar_detalles'] = medir(
+        lambda: [(indice_detalles.fila(e), indice_detalles.valvulas_de(e), indice_detalles.rines_de(e),
+                  indice_detalles.minas_de(e)) for e in equipos], repeticiones)
+
+    # Consulta masiva de compatibilidad
+    codigos = rng.choices(list(tablas['llantas']['CAI'].dropna()), k=1000)
+    consultas_masivas = pd.DataFrame({'Tipo consulta': 'CAI', 'Consulta': codigos})
+    resultados['matriz_compatibilidad'] = medir(lambda: matriz_compatibilidad(tablas, consultas_masivas), repeticiones)
+
+    # Imágenes: una página de tarjetas
+    directorio_imagenes = os.path.join(directorio, 'imagenes')
+    generar_imagenes(directorio_imagenes, IMAGENES_BASE * escala, semilla)
+    pagina = [f"img_{i}.jpg" for i in range(min(12, IMAGENES_BASE * escala))]
+
+    def miniaturas_en_frio():
+        directorio_cache = os.path.join(directorio, 'miniaturas')
+        shutil.rmtree(directorio_cache, ignore_errors=True)
+        cache = CacheMiniaturas(directorio_imagenes, directorio_cache)
+        # Igual que la cuadrícula: preparar la página en el pool y luego servirla
+        cache.preparar(pagina, ALTURA_TARJETA)
+        for nombre in pagina:
+            cache.obtener(nombre, ALTURA_TARJETA)
+
+    resultados['miniaturas_frio'] = medir(miniaturas_en_frio, repeticiones)
+    cache = CacheMiniaturas(directorio_imagenes, os.path.join(directorio, 'miniaturas'))
+    resultados['miniaturas_disco'] = medir(
+        lambda: [CacheMiniaturas(directorio_imagenes, cache.directorio_cache).obtener(n) for n in pagina],
+        repeticiones)
+    for nombre in pagina:
+        cache.obtener(nombre)
+    resultados['miniaturas_memoria'] = medir(lambda: [cache.obtener(n) for n in pagina], repeticiones)
+
+    filas = {tabla: len(df) for tabla, df in tablas.items()}
+    return {'filas': filas, 'imagenes': IMAGENES_BASE * escala, 'memoria_bytes': bytes_tablas, 'tiempos': resultados}
+
+
+def commit_actual():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def comparar(actual, anterior, tolerancia=TOLERANCIA_REGRESION):
+    """Lista de (escala, medición, ms anterior, ms actual, cambio) con regresiones mayores a la tolerancia."""
+    regresiones = []
+    for escala, datos in actual['escalas'].items():
+        base = anterior.get('escalas', {}).get(escala)
+        if base is None:
+            continue
+        for nombre, tiempo in datos['tiempos'].items():
+            tiempo_base = base['tiempos'].get(nombre)
+            if tiempo_base is None or tiempo_base['mediana_ms'] <= 0:
+                continue
+            cambio = tiempo['mediana_ms'] / tiempo_base['mediana_ms'] - 1
+            if cambio > tolerancia:
+                regresiones.append((escala, nombre, tiempo_base['mediana_ms'], tiempo['mediana_ms'], cambio))
+    return regresiones
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks del catálogo con datos sintéticos.")
+    parser.add_argument('--escalas', type=int, nargs='+', default=[1, 10, 100], help="Escalas a medir")
+    parser.add_argument('--repeticiones', type=int, default=5, help="Repeticiones por medición")
+    parser.add_argument('--semilla', type=int, default=0, help="Semilla de los datos sintéticos")
+    parser.add_argument('--salida', help="Archivo JSON de resultados (por defecto, salida estándar)")
+    parser.add_argument('--comparar', help="JSON de una corrida anterior para reportar regresiones")
+    parser.add_argument('--mysql', nargs=5, metavar=('HOST', 'PUERTO', 'USUARIO', 'CONTRASEÑA', 'BASE'),
+                        help="MySQL local de prueba; sus tablas del catálogo se reemplazan con datos sintéticos")
+    args = parser.parse_args()
+
+    config_mysql = None
+    if args.mysql:
+        host, puerto, usuario, contrasena, base = args.mysql
+        config_mysql = {'host': host, 'port': int(puerto), 'user': usuario, 'password': contrasena, 'database': base}
+
+    resultado = {
+        'commit': commit_actual(),
+        'fecha': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'numpy': np.__version__,
+        'escalas': {},
+    }
+    for escala in args.escalas:
+        print(f"Midiendo escala {escala}x...", file=sys.stderr)
+        with tempfile.TemporaryDirectory(prefix='catalogo_bench_') as directorio:
+            resultado['escalas'][f"{escala}x"] = benchmark_escala(
+                escala, directorio, args.repeticiones, config_mysql, args.semilla)
+
+    texto = json.dumps(resultado, ensure_ascii=False, indent=2)
+    if args.salida:
+        with open(args.salida, 'w', encoding='utf-8') as f:
+            f.write(texto)
+    else:
+        print(texto)
+
+    if args.comparar:
+        with open(args.comparar, encoding='utf-8') as f:
+            anterior = json.load(f)
+        regresiones = comparar(resultado, anterior)
+        for escala, nombre, antes, despues, cambio in regresiones:
+            print(f"Regresión {escala} {nombre}: {antes:.2f} ms -> {despues:.2f} ms (+{cambio:.0%})", file=sys.stderr)
+        if regresiones:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,111 @@
+"""Búsqueda tolerante a errores sobre el catálogo de modelos.
+
+Los textos de 'Equipment Description', 'Fabricante' y 'Tipo' se normalizan
+(sin acentos, minúsculas, solo letras y dígitos), así que "CAT 777" y
+"CAT777G" comparten los trigramas "cat", "at7", "t77" y "777". Cada campo
+tiene sus postings trigrama -> ids de modelo en arreglos de numpy.
+
+Una consulta cuenta los trigramas en común con cada modelo con un solo
+bincount por campo y puntúa con la proporción de trigramas de la consulta
+presentes en el campo (con el coeficiente de Dice como desempate). Se queda
+con el mejor campo ponderado y suma un bono cuando la consulta aparece tal
+cual, o al inicio, de la descripción. Los resultados salen ordenados por
+relevancia.
+"""
+import re
+import unicodedata
+
+import numpy as np
+import pandas as pd
+
+# Campo -> peso en el puntaje final
+CAMPOS = {
+    'Equipment Description': 1.0,
+    'Fabricante': 0.8,
+    'Tipo': 0.8,
+}
+
+# Proporción mínima de trigramas de la consulta que deben coincidir
+UMBRAL = 0.5
+
+BONO_SUBCADENA = 0.5
+BONO_PREFIJO = 0.25
+
+_NO_ALFANUMERICO = re.compile(r'[^a-z0-9]+')
+
+
+def normalizar(texto):
+    texto = unicodedata.normalize('NFKD', str(texto))
+    texto = ''.join(c for c in texto if not unicodedata.combining(c)).lower()
+    return _NO_ALFANUMERICO.sub('', texto)
+
+
+def _normalizar_serie(serie):
+    return [normalizar(v) if pd.notna(v) else '' for v in serie]
+
+
+def trigramas(texto):
+    if len(texto) < 3:
+        return {texto} if texto else set()
+    return {texto[i:i + 3] for i in range(len(texto) - 2)}
+
+
+class MotorBusqueda:
+    """Índice de trigramas normalizados sobre las filas de un DataFrame de modelos."""
+
+    def __init__(self, df, campos=CAMPOS):
+        self.n = len(df)
+        self.campos = {campo: peso for campo, peso in campos.items() if campo in df.columns}
+        self._postings = {}
+        self._num_trigramas = {}
+        # Arreglo de texto de ancho fijo para comparar subcadenas en bloque con np.char
+        self._descripciones = np.array(_normalizar_serie(df['Equipment Description']), dtype=str)
+
+        for campo in self.campos:
+            textos = self._descripciones if campo == 'Equipment Description' else _normalizar_serie(df[campo])
+            postings = {}
+            num_trigramas = np.zeros(self.n, dtype=np.int32)
+            for doc, texto in enumerate(textos):
+                gramas = trigramas(texto)
+                num_trigramas[doc] = len(gramas)
+                for grama in gramas:
+                    postings.setdefault(grama, []).append(doc)
+            self._postings[campo] = {grama: np.array(docs, dtype=np.int32) for grama, docs in postings.items()}
+            self._num_trigramas[campo] = num_trigramas
+
+    def _puntajes(self, consulta):
+        gramas = trigramas(consulta)
+        puntaje = np.zeros(self.n)
+        for campo, peso in self.campos.items():
+            postings = [self._postings[campo][g] for g in gramas if g in self._postings[campo]]
+            if not postings:
+                continue
+            comunes = np.bincount(np.concatenate(postings), minlength=self.n)
+            contencion = comunes / len(gramas)
+            dice = 2 * comunes / (len(gramas) + np.maximum(self._num_trigramas[campo], 1))
+            similitud = np.where(contencion >= UMBRAL, 0.8 * contencion + 0.2 * dice, 0.0)
+            np.maximum(puntaje, peso * similitud, out=puntaje)
+        return puntaje
+
+    def buscar(self, consulta, limite=None):
+        """Posiciones de las filas que coinciden, ordenadas por relevancia, y sus puntajes."""
+        consulta = normalizar(consulta)
+        if not consulta:
+            return np.arange(self.n), np.zeros(self.n)
+
+        if len(consulta) < 3:
+            # Consultas muy cortas: solo coincidencia directa en la descripción
+            puntaje = np.zeros(self.n)
+            candidatos = np.flatnonzero(np.char.find(self._descripciones, consulta) >= 0)
+        else:
+            puntaje = self._puntajes(consulta)
+            candidatos = np.flatnonzero(puntaje)
+
+        # Bonos por aparecer tal cual (y al inicio) en la descripción
+        posicion = np.char.find(self._descripciones[candidatos], consulta)
+        puntaje[candidatos] += np.where(posicion >= 0, BONO_SUBCADENA, 0.0) + np.where(posicion == 0, BONO_PREFIJO, 0.0)
+
+        orden = candidatos[np.argsort(-puntaje[candidatos], kind='stable')]
+        if limite is not None:
+            orden = orden[:limite]
+        return orden, puntaje[orden]
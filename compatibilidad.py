@@ -0,0 +1,233 @@
+"""Matriz de compatibilidad en bloque.
+
+Recibe una lista de consultas (códigos CAI o MAXAM, o modelos de equipo),
+normalmente leída de un CSV o XLSX, y devuelve una fila por cada pareja
+consulta-equipo compatible con el fabricante y tipo del equipo, todas sus
+llantas, sus válvulas, sus rines y el número de equipos por mina. Todo se
+resuelve con merges sobre las tablas completas: una consulta de miles de
+códigos cuesta lo mismo que unas pocas.
+
+Las consultas sin ningún equipo compatible se conservan con las columnas
+del equipo vacías, para que el reporte muestre qué códigos no se encontraron.
+
+Sin interfaz (por ejemplo, para un reporte nocturno):
+
+    python compatibilidad.py codigos.xlsx --salida compatibilidad.xlsx
+
+Por defecto usa el snapshot local y, si no hay, los CSV de data/; con --db
+lee las tablas de la base de datos con la configuración de
+.streamlit/secrets.toml.
+"""
+import argparse
+import io
+import os
+import tomllib
+
+import pandas as pd
+
+from conexion import TABLAS, GestorConexion, configuracion_desde_secrets
+from esquema import normalizar_codigos, tipar_tabla
+from snapshot import SnapshotInvalido, cargar_snapshot
+from vista_catalogo import agrupar_llantas, unir_por_equipo
+
+# Encabezado de columna del archivo -> tipo de consulta
+COLUMNAS_CONSULTA = {
+    'cai': 'CAI',
+    'maxam': 'MAXAM',
+    'equipment description': 'Modelo',
+    'modelo': 'Modelo',
+    'equipo': 'Modelo',
+}
+
+# Tipo de las consultas de un archivo sin encabezados reconocidos: se buscan en los tres
+TIPO_AUTOMATICO = 'Cualquiera'
+
+# Archivos CSV de respaldo de cada tabla, igual que en main.py
+ARCHIVOS_CSV = {
+    'Modelos': 'data/modelos.csv',
+    'llantas': 'data/llantas.csv',
+    'Valvulas': 'data/valvulas.csv',
+    'Rines': 'data/rines.csv',
+    'Equipos_Mina': 'data/equipos_mina.csv',
+}
+
+RUTA_SECRETS = '.streamlit/secrets.toml'
+
+PREFIJO_MINA = 'Mina: '
+
+COLUMNAS_EQUIPO = ['Equipment Description', 'Fabricante', 'Tipo',
+                   'Desc Michelin', 'CAI', 'Desc MAXAM', 'MAXAM', 'Válvulas', 'Rines', 'Total equipos']
+
+
+def _clave(serie):
+    """Texto de comparación: sin espacios alrededor y sin distinguir mayúsculas."""
+    return serie.astype('string').str.strip().str.casefold()
+
+
+def _equipos(serie):
+    return serie.astype(object).where(serie.notna())
+
+
+def _leer_tabla(archivo, nombre, header=0):
+    """CSV o XLSX como texto; un archivo abierto se relee desde el inicio."""
+    if hasattr(archivo, 'seek'):
+        archivo.seek(0)
+    if nombre.lower().endswith(('.xlsx', '.xlsm')):
+        return pd.read_excel(archivo, dtype=object, header=header)
+    return pd.read_csv(archivo, dtype=object, header=header)
+
+
+def leer_consultas(archivo, nombre=None):
+    """Lee un CSV o XLSX de consultas; devuelve un DataFrame con 'Tipo consulta' y 'Consulta'.
+
+    `archivo` puede ser una ruta o un archivo abierto (como el de
+    st.file_uploader); `nombre` decide el formato por la extensión. Las
+    columnas CAI, MAXAM y Equipment Description/Modelo/Equipo se reconocen
+    por su encabezado; si no hay ninguna, el archivo se lee sin encabezado,
+    se usa la primera columna y cada valor se busca como cualquiera de los tres.
+    """
+    nombre = nombre or getattr(archivo, 'name', None) or str(archivo)
+    df = _leer_tabla(archivo, nombre)
+    if df.columns.empty:
+        raise ValueError("El archivo no tiene columnas")
+
+    columnas = {columna: COLUMNAS_CONSULTA[str(columna).strip().lower()]
+                for columna in df.columns if str(columna).strip().lower() in COLUMNAS_CONSULTA}
+    if not columnas:
+        # Sin encabezados reconocidos la primera fila también es una consulta
+        df = _leer_tabla(archivo, nombre, header=None)
+        columnas = {df.columns[0]: TIPO_AUTOMATICO}
+
+    consultas = pd.concat([
+        pd.DataFrame({'Tipo consulta': tipo, 'Consulta': normalizar_codigos(df[columna])})
+        for columna, tipo in columnas.items()
+    ], ignore_index=True)
+    return consultas.dropna(subset=['Consulta']).drop_duplicates().reset_index(drop=True)
+
+
+def _claves_de_equipo(tablas):
+    """(Tipo consulta, Clave, Equipment Description) de todos los códigos de llanta y modelos."""
+    llantas, modelos = tablas['llantas'], tablas['Modelos']
+    pares = [
+        pd.DataFrame({'Tipo consulta': tipo, 'Clave': _clave(normalizar_codigos(llantas[tipo])),
+                      'Equipment Description': _equipos(llantas['Equipment Description'])})
+        for tipo in ('CAI', 'MAXAM') if tipo in llantas.columns
+    ]
+    pares.append(pd.DataFrame({'Tipo consulta': 'Modelo', 'Clave': _clave(modelos['Equipment Description']),
+                               'Equipment Description': _equipos(modelos['Equipment Description'])}))
+    return pd.concat(pares, ignore_index=True).dropna().drop_duplicates()
+
+
+def _detalles_por_equipo(tablas):
+    """Una fila por equipo con sus llantas, válvulas, rines y equipos por mina."""
+    modelos = tablas['Modelos']
+    detalles = pd.DataFrame({
+        'Equipment Description': _equipos(modelos['Equipment Description']),
+        'Fabricante': modelos['Fabricante'].astype(object),
+        'Tipo': modelos['Tipo'].astype(object),
+    }).drop_duplicates('Equipment Description').set_index('Equipment Description')
+
+    llantas = agrupar_llantas(tablas['llantas'])
+    llantas['Equipment Description'] = _equipos(llantas['Equipment Description'])
+    detalles = detalles.join(llantas.set_index('Equipment Description'), how='outer')
+
+    for nombre, tabla, descripcion in (('Válvulas', 'Valvulas', 'Nombre KT'), ('Rines', 'Rines', 'Descripcion Sugerida')):
+        df = tablas[tabla]
+        if df.empty or descripcion not in df.columns:
+            detalles[nombre] = None
+            continue
+        texto = (df[descripcion].astype('string') + ' (' + df['Codigo KT'].astype('string') + ')').dropna()
+        sub = pd.DataFrame({'Equipment Description': _equipos(df['Equipment Description']),
+                            'texto': texto}).dropna().drop_duplicates()
+        detalles = detalles.join(unir_por_equipo(sub['Equipment Description'], sub['texto'], '; ').rename(nombre))
+
+    equipos_mina = tablas['Equipos_Mina']
+    if not equipos_mina.empty and 'Mina' in equipos_mina.columns:
+        por_mina = (equipos_mina.groupby([_equipos(equipos_mina['Equipment Description']).rename('Equipment Description'),
+                                          equipos_mina['Mina'].astype(object)])['No Equipos']
+                    .sum().unstack(fill_value=0))
+        por_mina.columns = [f"{PREFIJO_MINA}{mina}" for mina in por_mina.columns]
+        detalles = detalles.join(por_mina)
+        detalles['Total equipos'] = por_mina.sum(axis=1)
+    else:
+        detalles['Total equipos'] = 0
+    return detalles.rename_axis('Equipment Description').reset_index()
+
+
+def matriz_compatibilidad(tablas, consultas):
+    """Matriz consulta x equipo compatible, en el orden de las consultas.
+
+    `tablas` es {nombre: DataFrame} con las cinco tablas del catálogo y
+    `consultas` un DataFrame como el de leer_consultas.
+    """
+    consultas = consultas[['Tipo consulta', 'Consulta']].reset_index(drop=True)
+    consultas = consultas.assign(_orden=range(len(consultas)), Clave=_clave(consultas['Consulta']))
+    pares = _claves_de_equipo(tablas)
+
+    automaticas = consultas['Tipo consulta'] == TIPO_AUTOMATICO
+    coincidencias = pd.concat([
+        consultas[~automaticas].merge(pares, on=['Tipo consulta', 'Clave'], how='left'),
+        consultas[automaticas].merge(pares.drop(columns='Tipo consulta').drop_duplicates(), on='Clave', how='left'),
+    ], ignore_index=True).sort_values('_orden', kind='stable')
+
+    matriz = coincidencias.merge(_detalles_por_equipo(tablas), on='Equipment Description', how='left')
+    minas = sorted(columna for columna in matriz.columns if columna.startswith(PREFIJO_MINA))
+    conteos = ['Total equipos'] + minas
+    matriz[conteos] = matriz[conteos].fillna(0).astype(int)
+    columnas = ['Tipo consulta', 'Consulta'] + [c for c in COLUMNAS_EQUIPO if c in matriz.columns] + minas
+    return matriz[columnas].reset_index(drop=True)
+
+
+def exportar(matriz, destino=None, formato=None):
+    """Escribe la matriz como CSV o XLSX en `destino`; sin destino devuelve los bytes."""
+    formato = formato or os.path.splitext(str(destino))[1].lstrip('.').lower() or 'csv'
+    salida = io.BytesIO() if destino is None else destino
+    if formato == 'xlsx':
+        matriz.to_excel(salida, index=False, sheet_name='Compatibilidad')
+    else:
+        # utf-8-sig para que Excel respete los acentos
+        matriz.to_csv(salida, index=False, encoding='utf-8-sig')
+    return salida.getvalue() if destino is None else None
+
+
+def cargar_tablas_locales():
+    """Tablas del snapshot local o, si no hay, de los CSV de data/."""
+    try:
+        lista, _ = cargar_snapshot()
+    except SnapshotInvalido:
+        lista = [pd.read_csv(ARCHIVOS_CSV[tabla]) for tabla in TABLAS]
+    return {tabla: tipar_tabla(tabla, df) for tabla, df in zip(TABLAS, lista)}
+
+
+def cargar_tablas_db(ruta_secrets=RUTA_SECRETS):
+    with open(ruta_secrets, 'rb') as f:
+        secrets = tomllib.load(f)
+    gestor = GestorConexion(configuracion_desde_secrets(secrets))
+    try:
+        return dict(zip(TABLAS, gestor.cargar_tablas(TABLAS)))
+    finally:
+        gestor.cerrar()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Matriz de compatibilidad para una lista de códigos de llanta o modelos.")
+    parser.add_argument('consultas', help="CSV o XLSX con columnas CAI, MAXAM o Equipment Description")
+    parser.add_argument('--salida', default='compatibilidad.xlsx', help="Archivo de salida (.xlsx o .csv)")
+    parser.add_argument('--db', action='store_true', help="Leer las tablas de la base de datos en lugar del snapshot/CSV")
+    parser.add_argument('--secrets', default=RUTA_SECRETS, help="Configuración de conexión para --db")
+    args = parser.parse_args()
+
+    tablas = cargar_tablas_db(args.secrets) if args.db else cargar_tablas_locales()
+    consultas = leer_consultas(args.consultas)
+    matriz = matriz_compatibilidad(tablas, consultas)
+    exportar(matriz, args.salida)
+
+    sin_coincidencia = matriz.loc[matriz['Equipment Description'].isna(), 'Consulta']
+    print(f"Consultas: {len(consultas)}")
+    print(f"Filas compatibles: {len(matriz) - len(sin_coincidencia)}")
+    print(f"Consultas sin coincidencia: {len(sin_coincidencia)}")
+    print(f"Matriz guardada en {args.salida}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,224 @@
+"""Gestor de conexión a la base de datos del catálogo.
+
+Mantiene vivo el túnel SSH a PythonAnywhere entre recargas de datos y un
+pool pequeño de conexiones MySQL detrás de él. Antes de entregar una
+conexión se comprueba que el túnel siga arriba; si se cayó, se reabre y se
+reconstruye el pool (el puerto local puede cambiar). Las tablas del
+catálogo se cargan en paralelo, una consulta por conexión del pool; si
+todas están ocupadas, quien pide una espera a que se libere (hasta
+ESPERA_CONEXION segundos) en lugar de reiniciar el túnel bajo las
+consultas en curso.
+
+Cada tabla se lee por lotes de TAMANO_LOTE filas con un cursor sin buffer
+que devuelve tuplas, y cada lote se tipa (esquema.py) antes de pedir el
+siguiente, así que nunca se tiene la tabla entera como lista de
+diccionarios. Solo se piden las columnas que usa la aplicación.
+
+Si la configuración no trae datos de SSH se conecta directamente a
+host/port, lo que permite probarlo contra un MySQL local.
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+import pandas as pd
+import sshtunnel
+from mysql.connector import errors, pooling
+
+from esquema import columnas_a_cargar, concatenar_lotes, tipar_tabla
+
+# Tablas del catálogo en el orden en que las usa la aplicación
+TABLAS = ['Modelos', 'llantas', 'Valvulas', 'Rines', 'Equipos_Mina']
+
+SSH_HOST = 'ssh.pythonanywhere.com'
+SSH_TIMEOUT = 15.0
+TAMANO_POOL = len(TABLAS)
+
+# Filas por lote al leer una tabla
+TAMANO_LOTE = 5000
+
+# Segundos máximos de espera por una conexión libre del pool
+ESPERA_CONEXION = 60.0
+
+
+def configuracion_desde_secrets(secrets):
+    """Arma la configuración del gestor a partir de st.secrets.
+
+    Si están 'ssh_username' y 'remote_bind_address' se usa el túnel SSH; si
+    no, se conecta a 'host'/'port' (por defecto 127.0.0.1:3306).
+    """
+    config = {
+        'user': secrets["user"],
+        'password': secrets["password"],
+        'database': secrets["database"],
+        'host': secrets.get("host", '127.0.0.1'),
+        'port': int(secrets.get("port", 3306)),
+    }
+    if "ssh_username" in secrets and "remote_bind_address" in secrets:
+        config['ssh'] = {
+            'host': secrets.get("ssh_host", SSH_HOST),
+            'username': secrets["ssh_username"],
+            'password': secrets["ssh_password"],
+            'remote_bind_address': (secrets["remote_bind_address"], 3306),
+        }
+    return config
+
+
+class GestorConexion:
+    """Túnel SSH persistente con un pool de conexiones MySQL."""
+
+    def __init__(self, config, tamano_pool=TAMANO_POOL):
+        self.config = config
+        self.tamano_pool = tamano_pool
+        self._tunel = None
+        self._pool = None
+        self._lock = threading.Lock()
+        # Una conexión prestada por cada lugar del pool; el resto espera su turno
+        self._disponibles = threading.BoundedSemaphore(tamano_pool)
+        self._executor = None
+        self._selects = {}
+
+    def _tunel_activo(self):
+        if self._tunel is None or not self._tunel.is_active:
+            return False
+        self._tunel.check_tunnels()
+        return all(self._tunel.tunnel_is_up.values())
+
+    def _abrir_tunel(self):
+        ssh = self.config['ssh']
+        # Configurar timeouts para el túnel SSH
+        sshtunnel.SSH_TIMEOUT = SSH_TIMEOUT
+        sshtunnel.TUNNEL_TIMEOUT = SSH_TIMEOUT
+        tunel = sshtunnel.SSHTunnelForwarder(
+            ssh['host'],
+            ssh_username=ssh['username'],
+            ssh_password=ssh['password'],
+            remote_bind_address=ssh['remote_bind_address'],
+        )
+        tunel.start()
+        return tunel
+
+    def _cerrar_tunel(self):
+        if self._tunel is not None:
+            try:
+                self._tunel.stop()
+            except Exception:
+                pass
+            self._tunel = None
+
+    def _crear_pool(self, host, port):
+        return pooling.MySQLConnectionPool(
+            pool_name=f"catalogo_{id(self)}_{port}",
+            pool_size=self.tamano_pool,
+            pool_reset_session=True,
+            user=self.config['user'],
+            password=self.config['password'],
+            database=self.config['database'],
+            host=host,
+            port=port,
+        )
+
+    def _asegurar_pool(self):
+        """Devuelve un pool sano, reabriendo el túnel si hace falta."""
+        with self._lock:
+            if 'ssh' in self.config:
+                if not self._tunel_activo():
+                    self._cerrar_tunel()
+                    self._pool = None
+                    self._tunel = self._abrir_tunel()
+                if self._pool is None:
+                    self._pool = self._crear_pool('127.0.0.1', self._tunel.local_bind_port)
+            elif self._pool is None:
+                self._pool = self._crear_pool(self.config['host'], self.config['port'])
+            return self._pool
+
+    def reiniciar(self):
+        """Descarta el pool y el túnel; la próxima conexión los vuelve a crear."""
+        with self._lock:
+            self._pool = None
+            self._cerrar_tunel()
+
+    @contextmanager
+    def conexion(self):
+        """Conexión del pool, comprobada con ping y reconexión automática.
+
+        Si el pool está ocupado espera a que se libere una conexión y, pasados
+        ESPERA_CONEXION segundos, lanza PoolError. Solo un ping fallido (túnel
+        o servidor caídos) reconstruye el túnel y el pool.
+        """
+        if not self._disponibles.acquire(timeout=ESPERA_CONEXION):
+            raise errors.PoolError(f"No se liberó ninguna conexión en {ESPERA_CONEXION:.0f} s")
+        try:
+            conn = self._asegurar_pool().get_connection()
+            try:
+                conn.ping(reconnect=True, attempts=2, delay=1)
+            except (errors.InterfaceError, errors.OperationalError):
+                # El túnel o el servidor se cayeron: reconstruir todo una vez
+                self.reiniciar()
+                conn = self._asegurar_pool().get_connection()
+            try:
+                yield conn
+            finally:
+                conn.close()  # Devuelve la conexión al pool
+        finally:
+            self._disponibles.release()
+
+    def consultar(self, sql, params=None):
+        with self.conexion() as conn:
+            cursor = conn.cursor(dictionary=True)
+            try:
+                cursor.execute(sql, params)
+                return pd.DataFrame(cursor.fetchall())
+            finally:
+                cursor.close()
+
+    def _select(self, tabla):
+        """SELECT con las columnas de la tabla que usa la aplicación (se arma una vez)."""
+        if tabla not in self._selects:
+            columnas = columnas_a_cargar(tabla, self.consultar(f"SHOW COLUMNS FROM {tabla}"))
+            lista = '*' if columnas is None else ', '.join(f"`{columna}`" for columna in columnas)
+            self._selects[tabla] = f"SELECT {lista} FROM {tabla}"
+        return self._selects[tabla]
+
+    def cargar_tabla(self, tabla, condicion=None, params=None, tamano_lote=TAMANO_LOTE):
+        """Lee la tabla (o las filas que cumplen `condicion`) por lotes ya tipados."""
+        sql = self._select(tabla)
+        if condicion:
+            sql = f"{sql} WHERE {condicion}"
+        with self.conexion() as conn:
+            cursor = conn.cursor(buffered=False)
+            try:
+                cursor.execute(sql, params)
+                columnas = list(cursor.column_names)
+                lotes = []
+                while True:
+                    filas = cursor.fetchmany(tamano_lote)
+                    if not filas:
+                        break
+                    lotes.append(tipar_tabla(tabla, pd.DataFrame.from_records(filas, columns=columnas)))
+            except Exception:
+                # Un cursor sin buffer deja filas pendientes; se descartan antes de devolver la conexión
+                conn.consume_results()
+                raise
+            finally:
+                cursor.close()
+        return concatenar_lotes(lotes, columnas)
+
+    def cargar_en_segundo_plano(self, tablas):
+        """Empieza a cargar las tablas en paralelo; devuelve {tabla: Future}."""
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.tamano_pool, thread_name_prefix='carga-tablas')
+            executor = self._executor
+        return {tabla: executor.submit(self.cargar_tabla, tabla) for tabla in tablas}
+
+    def cargar_tablas(self, tablas=TABLAS):
+        """Carga las tablas en paralelo y devuelve los DataFrames en el mismo orden."""
+        return [futuro.result() for futuro in self.cargar_en_segundo_plano(tablas).values()]
+
+    def cerrar(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False)
+                self._executor = None
+        self.reiniciar()
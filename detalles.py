@@ -0,0 +1,89 @@
+"""Tablas de consulta precalculadas para el panel de detalles del equipo.
+
+Todo lo que muestra mostrar_detalles se agrupa una sola vez por
+'Equipment Description': la fila del catálogo con las llantas agrupadas,
+las válvulas, los rines y el total de equipos por mina. Un clic en
+"Ver detalles" se resuelve con búsquedas en diccionarios, sin filtrar ni
+agrupar los DataFrames completos.
+"""
+import numpy as np
+import pandas as pd
+
+COLUMNAS_VALVULAS = ['Marca Valvula', 'Componente', 'Nombre KT', 'Codigo KT']
+COLUMNAS_RINES = ['Marca Rin', 'Componentes', 'Descripcion Sugerida', 'Codigo KT']
+
+
+def posiciones_por_equipo(equipos):
+    """Posiciones de las filas de cada equipo, calculadas en una sola pasada."""
+    if len(equipos) == 0:
+        return {}
+    codigos, unicos = pd.factorize(equipos)
+    validos = np.flatnonzero(codigos >= 0)
+    orden = validos[np.argsort(codigos[validos], kind='stable')]
+    cortes = np.flatnonzero(np.diff(codigos[orden])) + 1
+    return dict(zip(unicos, np.split(orden, cortes))) if len(orden) else {}
+
+
+class TablaPorEquipo:
+    """Una tabla lista para st.table y las posiciones de las filas de cada equipo.
+
+    Consultar un equipo es una búsqueda en un diccionario más un iloc sobre
+    sus pocas filas; no se crea un DataFrame por equipo al construirla.
+    """
+
+    def __init__(self, tabla, equipos):
+        self.tabla = tabla
+        self.posiciones = posiciones_por_equipo(equipos)
+
+    def __len__(self):
+        return len(self.posiciones)
+
+    def __contains__(self, equipo):
+        return equipo in self.posiciones
+
+    def get(self, equipo):
+        posiciones = self.posiciones.get(equipo)
+        if posiciones is None:
+            return None
+        return self.tabla.iloc[posiciones]
+
+
+def _tablas_por_equipo(df, columnas, indice):
+    """Tabla de df con las columnas a mostrar, agrupable por 'Equipment Description'."""
+    if df.empty or 'Equipment Description' not in df.columns:
+        return TablaPorEquipo(pd.DataFrame(), pd.Series([], dtype=object))
+    return TablaPorEquipo(df[columnas].set_index(indice), df['Equipment Description'])
+
+
+def _equipos_por_mina(df_equipos_mina):
+    """Total de 'No Equipos' por mina para cada equipo."""
+    if df_equipos_mina.empty or 'Equipment Description' not in df_equipos_mina.columns:
+        return TablaPorEquipo(pd.DataFrame(), pd.Series([], dtype=object))
+    totales = df_equipos_mina.groupby(['Equipment Description', 'Mina'], observed=True)['No Equipos'].sum().reset_index()
+    return TablaPorEquipo(totales[['Mina', 'No Equipos']].set_index('Mina'), totales['Equipment Description'])
+
+
+class IndiceDetalles:
+    """Detalles de cada equipo indexados por 'Equipment Description'."""
+
+    def __init__(self, df_modelos_llantas_grouped, df_valvulas, df_rines, df_equipos_mina):
+        self.filas = {
+            fila['Equipment Description']: fila
+            for fila in df_modelos_llantas_grouped.to_dict('records')
+        }
+        self.valvulas = _tablas_por_equipo(df_valvulas, COLUMNAS_VALVULAS, 'Codigo KT')
+        self.rines = _tablas_por_equipo(df_rines, COLUMNAS_RINES, 'Codigo KT')
+        self.minas = _equipos_por_mina(df_equipos_mina)
+
+    def fila(self, equipo):
+        """Fila del catálogo (modelo + llantas agrupadas) o None si no existe."""
+        return self.filas.get(equipo)
+
+    def valvulas_de(self, equipo):
+        return self.valvulas.get(equipo)
+
+    def rines_de(self, equipo):
+        return self.rines.get(equipo)
+
+    def minas_de(self, equipo):
+        return self.minas.get(equipo)
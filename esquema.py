@@ -0,0 +1,138 @@
+"""Tipos de las columnas de las tablas del catálogo.
+
+Las tablas llegan de la base de datos con todas las columnas como object
+(el cursor devuelve diccionarios de Python) y de los CSV con los códigos de
+llanta como float cuando hay nulos ("12345.0"). `tipar_tabla` las deja con
+un mismo esquema sin importar el origen:
+
+- las columnas de texto con pocos valores distintos (tipo, fabricante, mina,
+  marcas y el nombre del equipo en las tablas hijas) como categorías, que
+  guardan cada valor una sola vez y se comparan por código entero,
+- los códigos CAI y MAXAM como texto normalizado, sin ".0" ni espacios,
+- los conteos como enteros.
+
+El resultado se comparte entre todas las sesiones a través del estado del
+sincronizador, que vive en st.cache_resource; nadie lo modifica en sitio.
+
+COLUMNAS_USADAS lista lo que la aplicación lee de cada tabla; de la base de
+datos solo se traen esas columnas más la llave primaria y la columna de
+fecha de actualización, que necesita la sincronización incremental.
+"""
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+COLUMNAS_USADAS = {
+    'Modelos': ['Equipment Description', 'Fabricante', 'Tipo', 'Imagen'],
+    'llantas': ['Equipment Description', 'Desc Michelin', 'Desc MAXAM', 'CAI', 'MAXAM'],
+    'Valvulas': ['Equipment Description', 'Marca Valvula', 'Componente', 'Nombre KT', 'Codigo KT'],
+    'Rines': ['Equipment Description', 'Marca Rin', 'Componentes', 'Descripcion Sugerida', 'Codigo KT'],
+    'Equipos_Mina': ['Equipment Description', 'Mina', 'No Equipos'],
+}
+
+# Nombres de columna que se reconocen como fecha de última actualización
+COLUMNAS_ACTUALIZACION = ('updated_at', 'fecha_actualizacion', 'ultima_actualizacion')
+
+COLUMNAS_CATEGORICAS = {
+    'Modelos': ['Tipo', 'Fabricante'],
+    'llantas': ['Equipment Description'],
+    'Valvulas': ['Equipment Description', 'Marca Valvula', 'Componente'],
+    'Rines': ['Equipment Description', 'Marca Rin', 'Componentes'],
+    'Equipos_Mina': ['Equipment Description', 'Mina'],
+}
+
+COLUMNAS_CODIGO = {
+    'llantas': ['CAI', 'MAXAM'],
+}
+
+COLUMNAS_ENTERAS = {
+    'Equipos_Mina': ['No Equipos'],
+}
+
+
+def normalizar_codigos(serie):
+    """Códigos como texto: enteros sin ".0", sin espacios y vacíos como nulos.
+
+    Solo se convierten los valores que ya son números; un código escrito
+    como texto ("0077") se conserva tal cual.
+    """
+    if isinstance(serie.dtype, pd.CategoricalDtype):
+        serie = serie.astype(serie.cat.categories.dtype)
+    if pd.api.types.is_numeric_dtype(serie):
+        numeros = serie
+    else:
+        numeros = pd.to_numeric(serie.where(serie.map(lambda v: not isinstance(v, str))), errors='coerce')
+    enteros = numeros.notna() & (numeros % 1 == 0)
+    texto = serie.astype('string').str.strip()
+    texto[enteros] = numeros[enteros].astype('int64').astype('string')
+    return texto.mask(texto == '')
+
+
+def _entera(serie):
+    numeros = pd.to_numeric(serie, errors='coerce')
+    if numeros.isna().any():
+        return numeros
+    return numeros.astype('int64')
+
+
+def tabla_vacia(tabla):
+    """Tabla sin filas con las columnas usadas de `tabla`, ya tipadas."""
+    return tipar_tabla(tabla, pd.DataFrame({columna: pd.Series(dtype=object)
+                                            for columna in COLUMNAS_USADAS.get(tabla, [])}))
+
+
+def tipar_tabla(tabla, df):
+    """Copia de df con el esquema de `tabla`; las columnas que falten se ignoran.
+
+    Una tabla sin columnas (pendiente de carga o sin CSV) se sustituye por
+    tabla_vacia, para que los derivados encuentren las columnas que leen.
+    """
+    if df.columns.empty and COLUMNAS_USADAS.get(tabla):
+        return tabla_vacia(tabla)
+    tipos = {}
+    for columna in COLUMNAS_CATEGORICAS.get(tabla, []):
+        if columna in df.columns and not isinstance(df[columna].dtype, pd.CategoricalDtype):
+            tipos[columna] = df[columna].astype('category')
+    for columna in COLUMNAS_CODIGO.get(tabla, []):
+        if columna in df.columns:
+            tipos[columna] = normalizar_codigos(df[columna])
+    for columna in COLUMNAS_ENTERAS.get(tabla, []):
+        if columna in df.columns:
+            tipos[columna] = _entera(df[columna])
+    if not tipos:
+        return df
+    return df.assign(**tipos)
+
+
+def columnas_a_cargar(tabla, columnas):
+    """Columnas de `tabla` que hay que traer, dado el resultado de SHOW COLUMNS.
+
+    Devuelve None (todas) si la tabla no tiene ninguna de las columnas usadas.
+    """
+    usadas = set(COLUMNAS_USADAS.get(tabla, []))
+    if columnas.empty or not usadas.intersection(columnas['Field']):
+        return None
+    return [
+        campo for campo, llave in zip(columnas['Field'], columnas['Key'])
+        if campo in usadas or llave == 'PRI' or campo in COLUMNAS_ACTUALIZACION
+    ]
+
+
+def concatenar_lotes(lotes, columnas):
+    """Une lotes ya tipados; las categorías de cada lote se combinan sin pasar por object."""
+    if not lotes:
+        return pd.DataFrame(columns=list(columnas))
+    if len(lotes) == 1:
+        return lotes[0]
+    unidas = {}
+    for columna in columnas:
+        series = [lote[columna] for lote in lotes]
+        if all(isinstance(serie.dtype, pd.CategoricalDtype) for serie in series):
+            unidas[columna] = pd.Categorical(union_categoricals([serie.array for serie in series], ignore_order=True))
+        else:
+            unidas[columna] = pd.concat(series, ignore_index=True)
+    return pd.DataFrame(unidas)
+
+
+def memoria(df):
+    """Bytes que ocupa df en memoria, incluido el contenido de las cadenas."""
+    return int(df.memory_usage(deep=True).sum())
@@ -0,0 +1,160 @@
+"""Índice invertido para la búsqueda por llanta.
+
+Se construye una sola vez por carga de datos a partir de df_llantas. Cada
+valor distinto de 'Desc Michelin', 'Desc MAXAM', 'CAI' y 'MAXAM' se
+normaliza a minúsculas y se descompone en n-gramas de 1 a 3 caracteres.
+
+Los postings se guardan como arreglos de numpy en formato CSR (un arreglo
+de inicios y uno de identificadores, sin un set por n-grama):
+
+- n-grama -> equipos que usan algún valor que lo contiene, ya sin repetidos,
+  así que una consulta de hasta 3 caracteres es una búsqueda en el
+  diccionario más un corte del arreglo;
+- n-grama -> valores que lo contienen, y valor -> equipos que lo usan, para
+  las consultas más largas: se toma el posting más pequeño de sus
+  trigramas, se verifica la subcadena solo sobre esos valores (con pyarrow,
+  sin un ciclo de Python) y se marcan sus equipos en un arreglo booleano.
+"""
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+# Campo de df_llantas -> etiqueta usada en el selector de la pestaña de llantas
+CAMPOS = {
+    'Desc Michelin': 'MICHELIN',
+    'Desc MAXAM': 'MAXAM',
+    'CAI': 'CAI',
+    'MAXAM': 'MAXAM Code',
+}
+
+TAMANO_NGRAMA = 3
+
+
+def normalizar(texto):
+    return str(texto).strip().lower()
+
+
+def ngramas(texto, n=TAMANO_NGRAMA):
+    """Todos los n-gramas de longitud 1..n del texto."""
+    return {texto[i:i + k] for k in range(1, n + 1) for i in range(len(texto) - k + 1)}
+
+
+def _csr(grupos, miembros, n_grupos, n_miembros):
+    """Pares (grupo, miembro) sin repetidos: los miembros de g son miembros[inicio[g]:inicio[g + 1]]."""
+    claves = np.sort(np.asarray(grupos, dtype=np.int64) * max(n_miembros, 1) + np.asarray(miembros, dtype=np.int64))
+    claves = claves[np.r_[True, claves[1:] != claves[:-1]]] if len(claves) else claves
+    grupos, miembros = np.divmod(claves, max(n_miembros, 1))
+    return np.searchsorted(grupos, np.arange(n_grupos + 1)), miembros.astype(np.int32)
+
+
+def _reunir(inicio, miembros, grupos):
+    """Miembros de todos los `grupos` concatenados (con repetidos) y cuántos aporta cada grupo."""
+    cuantos = inicio[grupos + 1] - inicio[grupos]
+    desplazamiento = np.repeat(inicio[grupos] - np.cumsum(cuantos) + cuantos, cuantos)
+    return miembros[desplazamiento + np.arange(desplazamiento.size)], cuantos
+
+
+class IndiceLlantas:
+    """Postings de n-gramas y diccionarios exactos sobre las llantas."""
+
+    def __init__(self, df_llantas):
+        # Identificadores enteros para los equipos
+        codigos, equipos = pd.factorize(df_llantas['Equipment Description'])
+        self.equipos = np.asarray(equipos, dtype=object)
+
+        # campo -> valor original -> lista de equipos (coincidencia exacta)
+        self.exactos = {campo: {} for campo in CAMPOS}
+        # etiqueta del selector -> (campo, valor)
+        self.opciones = {}
+
+        # Textos normalizados distintos y los pares (valor, equipo)
+        self._valores = []
+        id_por_valor = {}
+        pares_valor, pares_equipo = [], []
+
+        for campo, etiqueta in CAMPOS.items():
+            if campo not in df_llantas.columns:
+                continue
+            sub = pd.DataFrame({'equipo': codigos, 'valor': df_llantas[campo]}).dropna()
+            sub = sub[sub['equipo'] >= 0]
+            sub['valor'] = sub['valor'].astype(str)
+            sub = sub.drop_duplicates()
+
+            exactos = self.exactos[campo]
+            for equipo, valor in zip(sub['equipo'], sub['valor']):
+                exactos.setdefault(valor, []).append(self.equipos[equipo])
+
+                texto = normalizar(valor)
+                vid = id_por_valor.get(texto)
+                if vid is None:
+                    vid = id_por_valor[texto] = len(self._valores)
+                    self._valores.append(texto)
+                pares_valor.append(vid)
+                pares_equipo.append(equipo)
+
+            for valor in exactos:
+                self.opciones[f"{etiqueta} - {valor}"] = (campo, valor)
+
+        self._etiquetas = sorted(self.opciones)
+        self._textos = pa.array(self._valores, type=pa.string())
+
+        # valor -> equipos
+        n_valores, n_equipos = len(self._valores), len(self.equipos)
+        self._inicio_equipos_valor, self._equipos_valor = _csr(pares_valor, pares_equipo, n_valores, n_equipos)
+
+        # n-grama -> valores
+        grams, por_valor = [], []
+        for texto in self._valores:
+            grams_valor = ngramas(texto)
+            grams.extend(grams_valor)
+            por_valor.append(len(grams_valor))
+        pares_ngrama, unicos = pd.factorize(np.array(grams, dtype=object))
+        self._id_ngrama = dict(zip(unicos, range(len(unicos))))
+        n_ngramas = len(unicos)
+        self._inicio_valores, self._valores_ngrama = _csr(pares_ngrama, np.repeat(np.arange(n_valores), por_valor),
+                                                          n_ngramas, n_valores)
+
+        # n-grama -> equipos, reuniendo los equipos de cada valor del n-grama
+        ngramas_por_par = np.repeat(np.arange(n_ngramas), np.diff(self._inicio_valores))
+        equipos_por_par, cuantos = _reunir(self._inicio_equipos_valor, self._equipos_valor, self._valores_ngrama)
+        self._inicio_equipos, self._equipos_ngrama = _csr(np.repeat(ngramas_por_par, cuantos), equipos_por_par,
+                                                          n_ngramas, n_equipos)
+
+    def etiquetas(self):
+        """Opciones del selector ordenadas alfabéticamente."""
+        return self._etiquetas
+
+    def equipos_por_opcion(self, etiqueta):
+        """Equipos que usan exactamente la llanta de la opción seleccionada."""
+        campo, valor = self.opciones.get(etiqueta, (None, None))
+        if campo is None:
+            return []
+        return self.exactos[campo][valor]
+
+    def _postings(self, inicio, miembros, gram):
+        gid = self._id_ngrama.get(gram)
+        if gid is None:
+            return miembros[:0]
+        return miembros[inicio[gid]:inicio[gid + 1]]
+
+    def buscar(self, consulta):
+        """Equipos con alguna llanta cuya descripción o código contenga la consulta.
+
+        Devuelve un arreglo de numpy con los equipos en orden de aparición.
+        """
+        consulta = normalizar(consulta)
+        if not consulta:
+            return self.equipos[:0]
+
+        if len(consulta) <= TAMANO_NGRAMA:
+            return self.equipos[self._postings(self._inicio_equipos, self._equipos_ngrama, consulta)]
+
+        # Candidatos: los valores del trigrama menos frecuente; verificarlos cuesta menos que intersectar
+        trigramas = {consulta[i:i + TAMANO_NGRAMA] for i in range(len(consulta) - TAMANO_NGRAMA + 1)}
+        candidatos = min((self._postings(self._inicio_valores, self._valores_ngrama, gram) for gram in trigramas), key=len)
+        contienen = pc.match_substring(self._textos.take(candidatos), consulta).to_numpy(zero_copy_only=False)
+        equipos, _ = _reunir(self._inicio_equipos_valor, self._equipos_valor, candidatos[contienen])
+        marcados = np.zeros(len(self.equipos), dtype=bool)
+        marcados[equipos] = True
+        return self.equipos[marcados]
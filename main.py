@@ -1,9 +1,27 @@
+import hashlib
+import io
+import logging
+import math
 import streamlit as st
-from PIL import Image, UnidentifiedImageError
-import os
 import pandas as pd
-import sshtunnel
-from mysql.connector import connect
+import folium
+from streamlit_folium import st_folium
+from conexion import GestorConexion, TABLAS, configuracion_desde_secrets
+from miniaturas import CacheMiniaturas, ALTURA_TARJETA, ALTURA_SIDEBAR
+from indice_llantas import IndiceLlantas
+from detalles import IndiceDetalles
+from vista_catalogo import VistaCatalogo
+from sincronizacion import SincronizadorCatalogo
+from mapa_minas import MapaMinas, TIPOS_OPERACION, agrupar_marcadores, distancia_km
+from snapshot import SnapshotInvalido, antiguedad, cargar_snapshot, esta_desactualizado, guardar_snapshot
+from compatibilidad import exportar, leer_consultas, matriz_compatibilidad
+from metricas import METRICAS, ARCHIVO_PROMETHEUS, incrementar, medido, medir, registrar_rerun
+
+# Las tablas del catálogo se comparten entre sesiones sin copiarlas; con
+# copy-on-write (por defecto desde pandas 3) un filtro devuelve una vista y
+# cualquier modificación crea una copia en lugar de alterar la tabla compartida
+if int(pd.__version__.split('.')[0]) < 3:
+    pd.set_option('mode.copy_on_write', True)
 
 # Inicializar la variable de estado para la contraseña
 if 'password_correct' not in st.session_state:
@@ -12,120 +30,265 @@ if 'password_correct' not in st.session_state:
 # Solicitar la contraseña al usuario si no ha sido verificada
 if not st.session_state.password_correct:
     password = st.text_input("Introduce la contraseña:", type="password")
-    if password == st.secrets["PASSWORD-0"]:
+    # La contraseña de administrador (opcional) también da acceso al panel de métricas
+    es_admin = "PASSWORD-ADMIN" in st.secrets and password == st.secrets["PASSWORD-ADMIN"]
+    if password == st.secrets["PASSWORD-0"] or es_admin:
         st.session_state.password_correct = True
+        st.session_state.es_admin = es_admin
         st.rerun()  # Recargar la aplicación para ocultar el campo de entrada de la contraseña
     elif password:
         st.error("Contraseña incorrecta")
 
 # Mostrar el contenido de la aplicación solo si la contraseña es correcta
 if st.session_state.password_correct:
-    @st.cache_data
+    # Medición opcional de tiempos y contadores (ver metricas.py)
+    if st.secrets.get("METRICAS", False):
+        METRICAS.activa = True
+    if METRICAS.activa:
+        METRICAS.iniciar_rerun()
+
+    @st.cache_resource
+    def obtener_gestor_conexion():
+        # El túnel SSH y el pool de conexiones sobreviven entre recargas de datos
+        return GestorConexion(configuracion_desde_secrets(st.secrets))
+
+    # Tablas sin las que no se puede mostrar la cuadrícula de modelos; las demás se cargan en segundo plano
+    TABLAS_INICIALES = ['Modelos', 'llantas']
+    TABLAS_DIFERIDAS = [tabla for tabla in TABLAS if tabla not in TABLAS_INICIALES]
+
+    @medido('carga_db')
     def load_data_from_db():
+        # Cargar Modelos y llantas en paralelo y dejar corriendo la carga del resto
+        gestor = obtener_gestor_conexion()
+        diferidas = gestor.cargar_en_segundo_plano(TABLAS_DIFERIDAS)
+        iniciales = dict(zip(TABLAS_INICIALES, gestor.cargar_tablas(TABLAS_INICIALES)))
+        tablas = [iniciales.get(tabla, pd.DataFrame()) for tabla in TABLAS]
+        return tablas, diferidas
+
+    # Archivos CSV locales de respaldo y el nombre con el que se reportan
+    ARCHIVOS_CSV = {
+        'Modelos': ("data/modelos.csv", "Modelos"),
+        'llantas': ("data/llantas.csv", "Llantas"),
+        'Valvulas': ("data/valvulas.csv", "Válvulas"),
+        'Rines': ("data/rines.csv", "Rines"),
+        'Equipos_Mina': ("data/equipos_mina.csv", "Equipos Mina"),
+    }
+
+    @medido('carga_csv')
+    def load_data_from_csv():
+        # Intenta cargar desde CSV si existen
+        tablas = []
+        for tabla in TABLAS:
+            ruta, nombre = ARCHIVOS_CSV[tabla]
+            try:
+                tablas.append(pd.read_csv(ruta))
+                st.success(f"Datos de {nombre} cargados correctamente")
+            except (OSError, pd.errors.ParserError, pd.errors.EmptyDataError) as e:
+                st.warning(f"No se pudieron cargar los datos de {nombre}: {e}")
+                tablas.append(pd.DataFrame())
+        return tablas
+
+    def guardar_snapshot_publicado(estado, firmas):
+        # Cada versión validada contra la base de datos se guarda como snapshot local
         try:
-            # Configurar timeouts para el túnel SSH
-            sshtunnel.SSH_TIMEOUT = 15.0
-            sshtunnel.TUNNEL_TIMEOUT = 15.0
-            
-            # Crear el túnel SSH
-            with sshtunnel.SSHTunnelForwarder(
-                ('ssh.pythonanywhere.com'),
-                ssh_username=st.secrets["ssh_username"], 
-                ssh_password=st.secrets["ssh_password"],
-                remote_bind_address=(st.secrets["remote_bind_address"], 3306)
-            ) as tunnel:
-                # Conectar a la base de datos a través del túnel
-                conn = connect(
-                    user=st.secrets["user"],
-                    password=st.secrets["password"],
-                    host='127.0.0.1', 
-                    port=tunnel.local_bind_port,
-                    database=st.secrets["database"]  # Ajusta el nombre de la base de datos si es necesario
-                )
-                
-                cursor = conn.cursor(dictionary=True)
-                
-                # Obtener datos de la tabla Modelos
-                cursor.execute("SELECT * FROM Modelos")
-                df_modelos = pd.DataFrame(cursor.fetchall())
-                
-                # Obtener datos de la tabla llantas
-                cursor.execute("SELECT * FROM llantas")
-                df_llantas = pd.DataFrame(cursor.fetchall())
-                
-                # Obtener datos de la tabla Valvulas
-                cursor.execute("SELECT * FROM Valvulas")
-                df_valvulas = pd.DataFrame(cursor.fetchall())
-                
-                # Obtener datos de la tabla Rines
-                cursor.execute("SELECT * FROM Rines")
-                df_rines = pd.DataFrame(cursor.fetchall())
-                
-                # Obtener datos de la tabla Equipos_Mina
-                cursor.execute("SELECT * FROM Equipos_Mina")
-                df_equipos_mina = pd.DataFrame(cursor.fetchall())
-                
-                cursor.close()
-                conn.close()
-                
-                return df_modelos, df_llantas, df_valvulas, df_rines, df_equipos_mina
-        
-        except Exception as e:
-            st.error(f"Error al conectar a la base de datos: {e}")
-            
-            # Si hay error, intentar cargar desde archivos CSV locales
+            guardar_snapshot(estado.tablas, firmas)
+        except OSError as e:
+            logging.getLogger(__name__).warning("No se pudo guardar el snapshot local: %s", e)
+
+    @st.cache_resource
+    def obtener_cache_miniaturas():
+        # Una sola caché de miniaturas por proceso, compartida entre sesiones
+        return CacheMiniaturas()
+
+    # Estructuras derivadas de las tablas; se reconstruyen solo cuando cambian sus dependencias
+    @medido('construir_vista_catalogo')
+    def construir_vista_catalogo(estado):
+        if estado['Modelos'].empty or estado['llantas'].empty:
+            return None
+        return VistaCatalogo(estado['Modelos'], estado['llantas'])
+
+    @medido('construir_indice_llantas')
+    def construir_indice_llantas(estado):
+        if estado['llantas'].empty:
+            return None
+        return IndiceLlantas(estado['llantas'])
+
+    @medido('construir_indice_detalles')
+    def construir_indice_detalles(estado):
+        if estado['vista_catalogo'] is None:
+            return None
+        return IndiceDetalles(estado['vista_catalogo'].catalogo, estado['Valvulas'], estado['Rines'], estado['Equipos_Mina'])
+
+    @medido('construir_equipos_por_planta')
+    def construir_equipos_por_planta(estado):
+        return obtener_mapa_minas().equipos_por_planta(estado['Equipos_Mina'])
+
+    # Consulta masiva: se recalcula solo si cambia el archivo o la versión del catálogo
+    @st.cache_data(max_entries=8, show_spinner="Calculando la matriz de compatibilidad...")
+    def calcular_consulta_masiva(contenido, nombre, version, _tablas):
+        consultas = leer_consultas(io.BytesIO(contenido), nombre)
+        with medir('consulta_masiva'):
+            matriz = matriz_compatibilidad(_tablas, consultas)
+        return len(consultas), matriz, exportar(matriz, formato='csv')
+
+    @st.cache_data(max_entries=8, show_spinner="Preparando el XLSX...")
+    def exportar_consulta_xlsx(contenido, nombre, version, _matriz):
+        return exportar(_matriz, formato='xlsx')
+
+    @st.cache_resource
+    def obtener_mapa_minas():
+        # Plantas.json se lee e indexa una sola vez por proceso
+        return MapaMinas()
+
+    @st.cache_resource
+    def obtener_sincronizador():
+        try:
+            # Arranque rápido desde el snapshot local; se revalida contra la base en segundo plano
+            with medir('carga_snapshot'):
+                tablas, manifest = cargar_snapshot()
+            firmas, origen = manifest['firmas'], 'snapshot'
+        except SnapshotInvalido as e:
+            st.info(f"{e}. Cargando desde la base de datos...")
+            firmas = manifest = None
             try:
+                (tablas, diferidas), origen = load_data_from_db(), 'db'
+            except Exception as e:
+                st.error(f"Error al conectar a la base de datos: {e}")
+                # Si hay error, intentar cargar desde archivos CSV locales
                 st.warning("Intentando cargar datos desde archivos locales...")
-                df_modelos = pd.DataFrame()
-                df_llantas = pd.DataFrame()
-                df_valvulas = pd.DataFrame()
-                df_rines = pd.DataFrame()
-                df_equipos_mina = pd.DataFrame()
-                
-                # Intenta cargar desde CSV si existen
-                try:
-                    df_modelos = pd.read_csv("data/modelos.csv")
-                    st.success("Datos de Modelos cargados correctamente")
-                except:
-                    st.warning("No se pudieron cargar los datos de Modelos")
-                    
-                try:
-                    df_llantas = pd.read_csv("data/llantas.csv")
-                    st.success("Datos de Llantas cargados correctamente")
-                except:
-                    st.warning("No se pudieron cargar los datos de Llantas")
-                    
-                try:
-                    df_valvulas = pd.read_csv("data/valvulas.csv")
-                    st.success("Datos de Válvulas cargados correctamente")
-                except:
-                    st.warning("No se pudieron cargar los datos de Válvulas")
-                    
-                try:
-                    df_rines = pd.read_csv("data/rines.csv")
-                    st.success("Datos de Rines cargados correctamente")
-                except:
-                    st.warning("No se pudieron cargar los datos de Rines")
-                    
-                try:
-                    df_equipos_mina = pd.read_csv("data/equipos_mina.csv")
-                    st.success("Datos de Equipos Mina cargados correctamente")
-                except:
-                    st.warning("No se pudieron cargar los datos de Equipos Mina")
-                    
-                return df_modelos, df_llantas, df_valvulas, df_rines, df_equipos_mina
-                
-            except Exception as e2:
-                st.error(f"Error al cargar datos locales: {e2}")
-                return pd.DataFrame(), pd.DataFrame(), pd.DataFrame(), pd.DataFrame(), pd.DataFrame()
+                tablas, origen = load_data_from_csv(), 'csv'
+        if origen != 'db':
+            diferidas = {}
+
+        # Después de la carga inicial solo se traen los cambios en segundo plano
+        sincronizador = SincronizadorCatalogo(obtener_gestor_conexion(), tablas, firmas=firmas, origen=origen,
+                                              al_publicar=guardar_snapshot_publicado, pendientes=diferidas,
+                                              manifest=manifest)
+        sincronizador.registrar('vista_catalogo', construir_vista_catalogo, ['Modelos', 'llantas'])
+        sincronizador.registrar('indice_llantas', construir_indice_llantas, ['llantas'])
+        sincronizador.registrar('indice_detalles', construir_indice_detalles, ['vista_catalogo', 'Valvulas', 'Rines', 'Equipos_Mina'])
+        sincronizador.registrar('equipos_por_planta', construir_equipos_por_planta, ['Equipos_Mina'])
+        sincronizador.recibir(diferidas)
+        sincronizador.iniciar(inmediato=True)
+        return sincronizador
+
+    def mostrar_imagen(contenedor, nombre_imagen, caption, altura=ALTURA_TARJETA):
+        # Servir la miniatura ya redimensionada desde la caché
+        try:
+            with medir('imagen'):
+                miniatura = obtener_cache_miniaturas().obtener(nombre_imagen, altura)
+            if miniatura is not None:
+                contenedor.image(miniatura, caption=caption, use_container_width=True)
+                incrementar('imagenes_enviadas')
+                incrementar('imagenes_bytes_enviados', len(miniatura))
+            else:
+                contenedor.write("Imagen no disponible")
+                incrementar('imagenes_no_disponibles')
+        except OSError:
+            # Imagen dañada, truncada o en un formato desconocido
+            contenedor.write("Error al cargar la imagen")
+            incrementar('imagenes_con_error')
+
+    # Vista inicial del mapa de minas (México completo)
+    LIMITES_MAPA = {"_southWest": {"lat": 14.0, "lng": -118.0}, "_northEast": {"lat": 33.0, "lng": -86.0}}
+    CENTRO_MAPA = {"lat": 23.6, "lng": -102.5}
+    ZOOM_INICIAL = 5
+    ETIQUETAS_TIPO = {'Surface': "Superficie", 'Underground': "Subterránea", 'Quarry': "Cantera"}
+    # El mapa vive en un iframe, así que el estilo de los grupos va en línea
+    ESTILO_GRUPO_PLANTAS = (
+        "width: 34px; height: 34px; line-height: 34px; border-radius: 50%; background-color: #ff5e00; "
+        "color: white; font-weight: bold; text-align: center; opacity: 0.85;"
+    )
+
+    # Opciones de paginación de la cuadrícula de tarjetas
+    TAMANOS_PAGINA = [12, 24, 48, 96]
+    MODOS_PAGINACION = ["Páginas", "Cargar más"]
+
+    def mostrar_cuadricula(df, prefijo, al_ver_detalles, num_columns=3):
+        # Mostrar las tarjetas de modelos paginadas; solo se materializa la parte visible
+        total = len(df)
+        if total == 0:
+            return
+
+        clave_pagina = f"{prefijo}_pagina"
+        clave_visibles = f"{prefijo}_visibles"
+        clave_firma = f"{prefijo}_firma"
+
+        col_tamano, col_modo = st.columns(2)
+        tamano_pagina = col_tamano.selectbox("Modelos por página", TAMANOS_PAGINA, key=f"{prefijo}_tamano_pagina")
+        modo = col_modo.radio("Modo de visualización", MODOS_PAGINACION, horizontal=True, key=f"{prefijo}_modo")
+
+        # Volver al inicio cuando cambian los resultados (filtros o búsqueda)
+        firma = (total, df.index[0], df.index[-1], tamano_pagina, modo)
+        if st.session_state.get(clave_firma) != firma:
+            st.session_state[clave_firma] = firma
+            st.session_state[clave_pagina] = 1
+            st.session_state[clave_visibles] = tamano_pagina
+
+        num_paginas = math.ceil(total / tamano_pagina)
+        if modo == "Páginas":
+            pagina = min(max(st.session_state[clave_pagina], 1), num_paginas)
+            inicio = (pagina - 1) * tamano_pagina
+            fin = min(inicio + tamano_pagina, total)
+        else:
+            inicio = 0
+            fin = min(st.session_state[clave_visibles], total)
+
+        st.caption(f"Mostrando {inicio + 1}-{fin} de {total} modelos")
+
+        visibles = df.iloc[inicio:fin]
+        # Generar en paralelo las miniaturas de la página antes de emitir las tarjetas
+        obtener_cache_miniaturas().preparar(visibles['Imagen'])
+        for i in range(0, len(visibles), num_columns):
+            cols = st.columns(num_columns)
+            for col, (_, row_data) in zip(cols, visibles.iloc[i:i + num_columns].iterrows()):
+                with col:
+                    st.markdown(f"<h3>{row_data['Equipment Description']}</h3>", unsafe_allow_html=True)
+                    mostrar_imagen(st, row_data['Imagen'], row_data['Equipment Description'])
+
+                    # Necesitamos una key única para cada botón
+                    if st.button(f"Ver detalles de {row_data['Equipment Description']}", key=f"{prefijo}_{row_data.name}"):
+                        al_ver_detalles(row_data)
+
+        # Funciones de devolución de llamada para la navegación
+        def cambiar_pagina(delta):
+            st.session_state[clave_pagina] = min(max(pagina + delta, 1), num_paginas)
+
+        def cargar_mas():
+            st.session_state[clave_visibles] = fin + tamano_pagina
+
+        if modo == "Páginas":
+            if num_paginas > 1:
+                col_anterior, col_pagina, col_siguiente = st.columns([1, 2, 1])
+                col_anterior.button("← Anterior", key=f"{prefijo}_anterior", on_click=cambiar_pagina, args=(-1,), disabled=pagina <= 1)
+                col_pagina.markdown(f"<p style='text-align: center'>Página {pagina} de {num_paginas}</p>", unsafe_allow_html=True)
+                col_siguiente.button("Siguiente →", key=f"{prefijo}_siguiente", on_click=cambiar_pagina, args=(1,), disabled=pagina >= num_paginas)
+        elif fin < total:
+            st.button("Cargar más", key=f"{prefijo}_cargar_mas", on_click=cargar_mas)
 
     # Cargar los datos aquí, fuera de la definición de la función
-    df_modelos, df_llantas, df_valvulas, df_rines, df_equipos_mina = load_data_from_db()
+    estado_catalogo = obtener_sincronizador().estado
+    df_modelos, df_llantas = estado_catalogo['Modelos'], estado_catalogo['llantas']
+
+    # Avisar mientras los datos no se hayan podido validar contra la base de datos
+    if estado_catalogo.origen == 'snapshot':
+        # Manifest leído al arrancar; el archivo puede haber cambiado o desaparecido desde entonces
+        manifest = obtener_sincronizador().manifest
+        if esta_desactualizado(manifest):
+            horas = int(antiguedad(manifest).total_seconds() // 3600)
+            st.warning(f"Mostrando datos guardados localmente hace {horas} horas; aún no se han podido verificar con la base de datos.")
+        else:
+            st.caption("Mostrando datos guardados localmente mientras se verifican con la base de datos.")
+    elif estado_catalogo.origen == 'csv':
+        st.warning("Mostrando datos de archivos locales; se reintentará la conexión a la base de datos en segundo plano.")
+    if estado_catalogo.pendientes:
+        cargando = ", ".join(ARCHIVOS_CSV[tabla][1] for tabla in TABLAS if tabla in estado_catalogo.pendientes)
+        st.caption(f"Cargando {cargando} en segundo plano; los detalles y el mapa se completan en cuanto terminen.")
 
     # Verificar que los DataFrames necesarios no estén vacíos
     if not df_modelos.empty and not df_llantas.empty:
-        # Crear dos pestañas para búsqueda por modelo o por llanta
-        tab1, tab2 = st.tabs(["Búsqueda por Modelo", "Búsqueda por Llanta"])
+        # Crear tres pestañas: búsqueda por modelo, búsqueda por llanta y mapa de minas
+        tab1, tab2, tab3 = st.tabs(["Búsqueda por Modelo", "Búsqueda por Llanta", "Mapa de Minas"])
         
         with tab1:
             # Añadir un identificador al inicio de la página
@@ -134,19 +297,8 @@ if st.session_state.password_correct:
             st.title("Catálogo de Equipos Mineros")
             st.subheader('Equipos Mineros usados en México')
 
-            # Agrupar por 'Equipment Description' y concatenar las descripciones y códigos de artículo
-            df_modelos_llantas_grouped = df_llantas.groupby('Equipment Description').agg({
-                'Desc Michelin': lambda x: ', '.join(x.dropna().unique()),
-                'Desc MAXAM': lambda x: ', '.join(x.dropna().unique()),
-                'CAI': lambda x: ', '.join(x.dropna().astype(str).unique()),
-                'MAXAM': lambda x: ', '.join(x.dropna().astype(str).unique())
-            }).reset_index()
-
-            df_modelos_llantas_grouped = df_modelos.merge(df_modelos_llantas_grouped, on='Equipment Description', how='left')
-
-            # Obtener opciones únicas para los filtros
-            tipos_equipo = df_modelos_llantas_grouped['Tipo'].unique()
-            fabricantes = df_modelos_llantas_grouped['Fabricante'].unique()
+            # Modelos unidos con sus llantas agrupadas, construidos una sola vez por versión de los datos
+            vista_catalogo = estado_catalogo['vista_catalogo']
 
             st.divider()
 
@@ -157,49 +309,33 @@ if st.session_state.password_correct:
                 st.session_state["search_query"] = ""
 
             # Añadir widgets de selección para los filtros
-            tipo_seleccionado = st.selectbox("Selecciona el tipo de equipo", ["Todos"] + list(tipos_equipo), key="tipo_seleccionado")
-            fabricante_seleccionado = st.selectbox("Selecciona el fabricante", ["Todos"] + list(fabricantes), key="fabricante_seleccionado")
+            tipo_seleccionado = st.selectbox("Selecciona el tipo de equipo", ["Todos"] + vista_catalogo.tipos, key="tipo_seleccionado")
+            fabricante_seleccionado = st.selectbox("Selecciona el fabricante", ["Todos"] + vista_catalogo.fabricantes, key="fabricante_seleccionado")
 
             # Añadir un buscador para filtrar la lista de modelos
             search_query = st.text_input("Buscar modelo de equipo", key="search_query")
 
             # Filtrar el DataFrame en función de las selecciones del usuario
-            filtered_df = df_modelos_llantas_grouped.copy()
-            if tipo_seleccionado != "Todos":
-                filtered_df = filtered_df[filtered_df['Tipo'] == tipo_seleccionado]
-            if fabricante_seleccionado != "Todos":
-                filtered_df = filtered_df[filtered_df['Fabricante'] == fabricante_seleccionado]
-            if search_query:
-                filtered_df = filtered_df[filtered_df['Equipment Description'].str.contains(search_query, case=False, na=False)]
+            with medir('busqueda_modelos' if search_query else 'filtrar_modelos'):
+                filtered_df = vista_catalogo.filtrar(
+                    tipo=None if tipo_seleccionado == "Todos" else tipo_seleccionado,
+                    fabricante=None if fabricante_seleccionado == "Todos" else fabricante_seleccionado,
+                    consulta=search_query,
+                )
 
             # Botón de Limpiar Filtros
             st.button("Limpiar Filtros", on_click=reset_filters)
 
             st.divider()
 
-            # Mostrar imágenes correspondientes a cada modelo de equipo en filas y columnas
-            num_columns = 3  # Número de columnas
-            rows = [filtered_df[i:i + num_columns] for i in range(0, filtered_df.shape[0], num_columns)]
-
-            # Altura fija para las imágenes
-            fixed_height = 500
+            # Tablas de detalles por equipo, calculadas una sola vez por carga de datos
+            indice_detalles = estado_catalogo['indice_detalles']
 
             # Función para mostrar detalles en el sidebar
+            @medido('mostrar_detalles')
             def mostrar_detalles(row):
                 st.sidebar.title(f"Detalles del equipo: {row['Equipment Description']}")
-                image_path = os.path.join('./images', row['Imagen']) 
-                try:
-                    if os.path.exists(image_path):
-                        image = Image.open(image_path)
-                        # Redimensionar la imagen manteniendo la relación de aspecto
-                        aspect_ratio = image.width / image.height
-                        new_width = int(fixed_height * aspect_ratio)
-                        resized_image = image.resize((new_width, fixed_height))
-                        st.sidebar.image(resized_image, caption=row['Equipment Description'], use_container_width=True)
-                    else:
-                        st.sidebar.write("Imagen no disponible")
-                except UnidentifiedImageError:
-                    st.sidebar.write("Error al cargar la imagen")
+                mostrar_imagen(st.sidebar, row['Imagen'], row['Equipment Description'], ALTURA_SIDEBAR)
 
                 st.sidebar.write(f"**Fabricante:** {row['Fabricante']}")
 
@@ -217,56 +353,30 @@ if st.session_state.password_correct:
                     for desc_maxam, maxam in zip(desc_maxam_list, maxam_list):
                         st.sidebar.write(f"**Descripción MAXAM:** {desc_maxam} ({maxam})")
 
-                # Filtrar datos de la tabla Valvulas
-                df_valvulas_filtrado = df_valvulas[df_valvulas['Equipment Description'] == row['Equipment Description']]
+                # Tablas precalculadas para este equipo
+                equipo = row['Equipment Description']
+                df_valvulas_filtrado = indice_detalles.valvulas_de(equipo)
+                df_rines_filtrado = indice_detalles.rines_de(equipo)
+                df_equipos_mina_grouped = indice_detalles.minas_de(equipo)
 
                 # Mostrar tabla de Valvulas en el sidebar dentro de un expander
-                if not df_valvulas_filtrado.empty:
+                if df_valvulas_filtrado is not None:
                     with st.sidebar.expander("**Válvulas**"):
-                        st.table(df_valvulas_filtrado[['Marca Valvula', 'Componente', 'Nombre KT', 'Codigo KT']].set_index('Codigo KT'))
-
-                # Filtrar datos de la tabla Rines
-                df_rines_filtrado = df_rines[df_rines['Equipment Description'] == row['Equipment Description']]
+                        st.table(df_valvulas_filtrado)
 
                 # Mostrar tabla de Rines en el sidebar dentro de un expander
-                if not df_rines_filtrado.empty:
+                if df_rines_filtrado is not None:
                     with st.sidebar.expander("**Rines**"):
-                        st.table(df_rines_filtrado[['Marca Rin', 'Componentes', 'Descripcion Sugerida', 'Codigo KT']].set_index('Codigo KT'))
-
-                # Filtrar datos de la tabla Equipos_Mina
-                df_equipos_mina_filtrado = df_equipos_mina[df_equipos_mina['Equipment Description'] == row['Equipment Description']]
-
-                # Agrupar datos de la tabla Equipos_Mina por 'Mina' y contar el número de equipos
-                if not df_equipos_mina_filtrado.empty:
-                    df_equipos_mina_grouped = df_equipos_mina_filtrado.groupby('Mina').agg({'No Equipos': 'sum'}).reset_index()
-
-                    # Mostrar el número de equipos por mina en el sidebar dentro de un expander
-                    if not df_equipos_mina_grouped.empty:
-                        with st.sidebar.expander("**Equipos por Mina**"):
-                            st.table(df_equipos_mina_grouped.set_index('Mina'))
-
-            for row in rows:
-                cols = st.columns(num_columns)
-                for col, (_, row_data) in zip(cols, row.iterrows()):
-                    with col:
-                        st.markdown(f"<h3>{row_data['Equipment Description']}</h3>", unsafe_allow_html=True)
-                        image_path = os.path.join('./images', row_data['Imagen'])
-                        
-                        try:
-                            if os.path.exists(image_path):
-                                image = Image.open(image_path)
-                                # Redimensionar la imagen manteniendo la relación de aspecto
-                                aspect_ratio = image.width / image.height
-                                new_width = int(fixed_height * aspect_ratio)
-                                resized_image = image.resize((new_width, fixed_height))
-                                st.image(resized_image, caption=row_data['Equipment Description'], use_container_width=True)
-                            else:
-                                st.write("Imagen no disponible")
-                        except UnidentifiedImageError:
-                            st.write("Error al cargar la imagen")
-                        
-                        if st.button(f"Ver detalles de {row_data['Equipment Description']}", key=f"details_{row_data.name}"):
-                            mostrar_detalles(row_data)
+                        st.table(df_rines_filtrado)
+
+                # Mostrar el número de equipos por mina en el sidebar dentro de un expander
+                if df_equipos_mina_grouped is not None:
+                    with st.sidebar.expander("**Equipos por Mina**"):
+                        st.table(df_equipos_mina_grouped)
+
+            # Mostrar imágenes correspondientes a cada modelo de equipo en filas y columnas
+            with medir('cuadricula_modelos'):
+                mostrar_cuadricula(filtered_df, "details", mostrar_detalles)
 
             # Añadir el botón de "Volver arriba"
             st.markdown("""
@@ -302,28 +412,14 @@ if st.session_state.password_correct:
             st.subheader("Encuentra modelos de equipo por código o descripción de llanta")
             st.divider()
 
-            # Crear listas de todas las descripciones y códigos disponibles de llantas
-            all_michelin_desc = df_llantas['Desc Michelin'].dropna().unique()
-            all_maxam_desc = df_llantas['Desc MAXAM'].dropna().unique()
-            all_cai_codes = df_llantas['CAI'].dropna().astype(str).unique()
-            all_maxam_codes = df_llantas['MAXAM'].dropna().astype(str).unique()
-
-            # Combinar todas las opciones para el selector
-            all_tire_options = []
-            for desc in all_michelin_desc:
-                all_tire_options.append(f"MICHELIN - {desc}")
-            for desc in all_maxam_desc:
-                all_tire_options.append(f"MAXAM - {desc}")
-            for code in all_cai_codes:
-                all_tire_options.append(f"CAI - {code}")
-            for code in all_maxam_codes:
-                all_tire_options.append(f"MAXAM Code - {code}")
-            
+            # Índice de llantas construido una sola vez por carga de datos
+            indice_llantas = estado_catalogo['indice_llantas']
+
             # Opción de búsqueda libre
             search_type = st.radio("Método de búsqueda", ["Seleccionar de la lista", "Búsqueda por texto"])
             
             if search_type == "Seleccionar de la lista":
-                selected_tire = st.selectbox("Selecciona una llanta", [""] + sorted(all_tire_options))
+                selected_tire = st.selectbox("Selecciona una llanta", [""] + indice_llantas.etiquetas())
             else:
                 selected_tire = st.text_input("Buscar por descripción o código de llanta")
 
@@ -331,71 +427,184 @@ if st.session_state.password_correct:
             if selected_tire:
                 filtered_models = []
                 
-                if search_type == "Seleccionar de la lista":
-                    if selected_tire.startswith("MICHELIN - "):
-                        desc = selected_tire.replace("MICHELIN - ", "")
-                        filtered_equipment = df_llantas[df_llantas['Desc Michelin'] == desc]['Equipment Description'].unique()
-                    elif selected_tire.startswith("MAXAM - "):
-                        desc = selected_tire.replace("MAXAM - ", "")
-                        filtered_equipment = df_llantas[df_llantas['Desc MAXAM'] == desc]['Equipment Description'].unique()
-                    elif selected_tire.startswith("CAI - "):
-                        code = selected_tire.replace("CAI - ", "")
-                        filtered_equipment = df_llantas[df_llantas['CAI'].astype(str) == code]['Equipment Description'].unique()
-                    elif selected_tire.startswith("MAXAM Code - "):
-                        code = selected_tire.replace("MAXAM Code - ", "")
-                        filtered_equipment = df_llantas[df_llantas['MAXAM'].astype(str) == code]['Equipment Description'].unique()
-                else:
-                    # Búsqueda por texto en todos los campos relevantes
-                    query = selected_tire.lower()
-                    michelin_match = df_llantas[df_llantas['Desc Michelin'].str.lower().fillna('').str.contains(query)]
-                    maxam_match = df_llantas[df_llantas['Desc MAXAM'].str.lower().fillna('').str.contains(query)]
-                    cai_match = df_llantas[df_llantas['CAI'].astype(str).str.lower().str.contains(query)]
-                    maxam_code_match = df_llantas[df_llantas['MAXAM'].astype(str).str.lower().str.contains(query)]
-                    
-                    # Combinar todos los resultados
-                    all_matches = pd.concat([michelin_match, maxam_match, cai_match, maxam_code_match])
-                    filtered_equipment = all_matches['Equipment Description'].unique()
-                
-                # Obtener los detalles completos de los equipos filtrados
-                filtered_models = df_modelos[df_modelos['Equipment Description'].isin(filtered_equipment)]
+                with medir('busqueda_llantas'):
+                    if search_type == "Seleccionar de la lista":
+                        # Búsqueda exacta en los diccionarios del índice
+                        filtered_equipment = indice_llantas.equipos_por_opcion(selected_tire)
+                    else:
+                        # Búsqueda por subcadena en todas las descripciones y códigos
+                        filtered_equipment = indice_llantas.buscar(selected_tire)
+
+                    # Obtener los detalles completos de los equipos filtrados
+                    filtered_models = df_modelos[df_modelos['Equipment Description'].isin(filtered_equipment)]
                 
                 # Mostrar resultados
                 st.divider()
                 if len(filtered_models) > 0:
                     st.write(f"Se encontraron {len(filtered_models)} modelos compatibles con esta llanta:")
                     
+                    def mostrar_detalles_llanta(row_data):
+                        # Necesitamos obtener los datos completos con llantas para mostrar detalles
+                        full_row_data = indice_detalles.fila(row_data['Equipment Description'])
+                        if full_row_data is not None:
+                            mostrar_detalles(full_row_data)
+
                     # Mostrar imágenes correspondientes a cada modelo de equipo en filas y columnas
-                    num_columns = 3  # Número de columnas
-                    rows = [filtered_models[i:i + num_columns] for i in range(0, filtered_models.shape[0], num_columns)]
-                    
-                    for row in rows:
-                        cols = st.columns(num_columns)
-                        for col, (_, row_data) in zip(cols, row.iterrows()):
-                            with col:
-                                st.markdown(f"<h3>{row_data['Equipment Description']}</h3>", unsafe_allow_html=True)
-                                image_path = os.path.join('./images', row_data['Imagen'])
-                                
-                                try:
-                                    if os.path.exists(image_path):
-                                        image = Image.open(image_path)
-                                        # Redimensionar la imagen manteniendo la relación de aspecto
-                                        aspect_ratio = image.width / image.height
-                                        new_width = int(fixed_height * aspect_ratio)
-                                        resized_image = image.resize((new_width, fixed_height))
-                                        st.image(resized_image, caption=row_data['Equipment Description'], use_container_width=True)
-                                    else:
-                                        st.write("Imagen no disponible")
-                                except UnidentifiedImageError:
-                                    st.write("Error al cargar la imagen")
-                                
-                                # Necesitamos una key única para cada botón
-                                if st.button(f"Ver detalles de {row_data['Equipment Description']}", key=f"tire_details_{row_data.name}"):
-                                    # Necesitamos obtener los datos completos con llantas para mostrar detalles
-                                    full_row_data = df_modelos_llantas_grouped[df_modelos_llantas_grouped['Equipment Description'] == row_data['Equipment Description']].iloc[0]
-                                    mostrar_detalles(full_row_data)
+                    with medir('cuadricula_llantas'):
+                        mostrar_cuadricula(filtered_models, "tire_details", mostrar_detalles_llanta)
                 else:
                     st.warning("No se encontraron modelos compatibles con esta llanta.")
             else:
                 st.info("Selecciona una llanta para ver los modelos compatibles.")
+
+            st.divider()
+
+            # Consulta de muchos códigos o modelos a la vez desde un archivo
+            with st.expander("Consulta masiva de compatibilidad"):
+                st.write("Sube un CSV o XLSX con columnas **CAI**, **MAXAM** o **Equipment Description**. "
+                         "Si no tiene esos encabezados, se busca cada valor de la primera columna como cualquiera de ellos.")
+                archivo_consultas = st.file_uploader("Archivo de consultas", type=["csv", "xlsx"], key="consulta_masiva")
+                if archivo_consultas is not None:
+                    clave_consulta = (archivo_consultas.getvalue(), archivo_consultas.name, estado_catalogo.version)
+                    try:
+                        num_consultas, matriz, csv_consulta = calcular_consulta_masiva(*clave_consulta, estado_catalogo.tablas)
+                    except (ValueError, pd.errors.ParserError, pd.errors.EmptyDataError) as e:
+                        st.error(f"No se pudo leer el archivo: {e}")
+                    else:
+                        if estado_catalogo.pendientes:
+                            st.warning("Algunas tablas se siguen cargando; las válvulas, rines o minas pueden salir incompletos.")
+                        sin_coincidencia = matriz['Equipment Description'].isna().sum()
+                        st.caption(f"{num_consultas} consultas, {len(matriz) - sin_coincidencia} filas compatibles, "
+                                   f"{sin_coincidencia} consultas sin coincidencia")
+                        st.dataframe(matriz, use_container_width=True, hide_index=True)
+
+                        col_csv, col_xlsx = st.columns(2)
+                        col_csv.download_button("Descargar CSV", csv_consulta,
+                                                file_name="compatibilidad.csv", mime="text/csv")
+                        # El XLSX tarda más que la matriz misma; se arma solo si se pide
+                        marca_xlsx = (hashlib.sha1(clave_consulta[0]).hexdigest(), estado_catalogo.version)
+                        if st.session_state.get('xlsx_consulta') == marca_xlsx:
+                            col_xlsx.download_button("Descargar XLSX", exportar_consulta_xlsx(*clave_consulta, matriz),
+                                                     file_name="compatibilidad.xlsx",
+                                                     mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
+                        elif col_xlsx.button("Preparar XLSX"):
+                            st.session_state.xlsx_consulta = marca_xlsx
+                            st.rerun()
+
+        with tab3:
+            st.title("Mapa de Minas")
+            st.subheader("Plantas mineras y equipos registrados por mina")
+            st.divider()
+
+            mapa_minas = obtener_mapa_minas()
+            plantas = mapa_minas.plantas
+            equipos_por_planta = estado_catalogo['equipos_por_planta']
+
+            # Filtros de plantas
+            estados_seleccionados = st.multiselect("Estados", mapa_minas.estados, key="mapa_estados")
+            tipos_seleccionados = st.multiselect("Tipo de operación", TIPOS_OPERACION, format_func=ETIQUETAS_TIPO.get, key="mapa_tipos")
+            solo_con_equipos = st.checkbox("Solo minas con equipos registrados", key="mapa_con_equipos")
+
+            mascara = mapa_minas.filtrar(estados_seleccionados, tipos_seleccionados)
+            if solo_con_equipos:
+                mascara &= equipos_por_planta > 0
+
+            # Vista actual del mapa: la última que devolvió st_folium, o México completo al inicio
+            vista_mapa = st.session_state.get("mapa_minas") or {}
+            limites = vista_mapa.get("bounds") or LIMITES_MAPA
+            zoom = vista_mapa.get("zoom") or ZOOM_INICIAL
+            centro = vista_mapa.get("center") or CENTRO_MAPA
+
+            # Solo las plantas visibles, agrupadas en el servidor según el zoom
+            visibles = mapa_minas.indice.en_rectangulo(
+                limites["_southWest"]["lat"], limites["_northEast"]["lat"],
+                limites["_southWest"]["lng"], limites["_northEast"]["lng"],
+            )
+            visibles = visibles[mascara[visibles]]
+            with medir('mapa_marcadores'):
+                grupos = agrupar_marcadores(mapa_minas.indice.latitudes, mapa_minas.indice.longitudes, visibles, zoom)
+
+            marcadores = folium.FeatureGroup(name="Plantas")
+            for lat, lon, miembros in grupos:
+                if len(miembros) == 1:
+                    planta = plantas.iloc[miembros[0]]
+                    popup = (
+                        f"<b>{planta['PLANT_NAME']}</b><br>{planta['OPER_NAME']}<br>"
+                        f"{planta['Ciudad']}, {planta['Estado']}<br>"
+                        f"Equipos registrados: {int(equipos_por_planta[miembros[0]])}"
+                    )
+                    folium.Marker([lat, lon], popup=folium.Popup(popup, max_width=300), tooltip=planta['PLANT_NAME']).add_to(marcadores)
+                else:
+                    total_equipos = int(equipos_por_planta[miembros].sum())
+                    folium.Marker(
+                        [lat, lon],
+                        tooltip=f"{len(miembros)} plantas, {total_equipos} equipos",
+                        icon=folium.DivIcon(
+                            html=f'<div style="{ESTILO_GRUPO_PLANTAS}">{len(miembros)}</div>',
+                            icon_size=(34, 34),
+                            icon_anchor=(17, 17),
+                        ),
+                    ).add_to(marcadores)
+
+            mapa = folium.Map(location=[CENTRO_MAPA["lat"], CENTRO_MAPA["lng"]], zoom_start=ZOOM_INICIAL)
+            st_folium(
+                mapa,
+                center=[centro["lat"], centro["lng"]],
+                zoom=zoom,
+                feature_group_to_add=marcadores,
+                key="mapa_minas",
+                height=600,
+                use_container_width=True,
+                returned_objects=["bounds", "zoom", "center"],
+            )
+            st.caption(f"{len(visibles)} plantas visibles en {len(grupos)} marcadores")
+
+            # Búsqueda de plantas cercanas con el índice espacial
+            with st.expander("Buscar plantas cercanas"):
+                planta_referencia = st.selectbox("Planta de referencia", [""] + list(plantas['PLANT_NAME']), key="mapa_referencia")
+                radio_km = st.slider("Radio (km)", 10, 500, 100, step=10, key="mapa_radio")
+                if planta_referencia:
+                    referencia = plantas[plantas['PLANT_NAME'] == planta_referencia].iloc[0]
+                    cercanas = mapa_minas.indice.en_radio(referencia['LATITUDE'], referencia['LONGITUDE'], radio_km)
+                    cercanas = cercanas[mascara[cercanas]]
+                    tabla_cercanas = plantas.iloc[cercanas][['PLANT_NAME', 'OPER_NAME', 'Estado']].copy()
+                    tabla_cercanas['Distancia (km)'] = distancia_km(
+                        referencia['LATITUDE'], referencia['LONGITUDE'],
+                        plantas['LATITUDE'].to_numpy()[cercanas], plantas['LONGITUDE'].to_numpy()[cercanas],
+                    ).round(1)
+                    tabla_cercanas['Equipos'] = equipos_por_planta[cercanas].astype(int)
+                    st.dataframe(tabla_cercanas.set_index('PLANT_NAME'), use_container_width=True)
     else:
-        st.error("No hay datos disponibles para mostrar en el catálogo.")
\ No newline at end of file
+        st.error("No hay datos disponibles para mostrar en el catálogo.")
+
+    # Cierre del rerun: línea de log, archivo para Prometheus y panel de administrador
+    if METRICAS.activa:
+        tiempos_rerun, contadores_rerun, total_rerun = METRICAS.terminar_rerun()
+        registrar_rerun(tiempos_rerun, contadores_rerun, total_rerun)
+        if ARCHIVO_PROMETHEUS:
+            try:
+                METRICAS.escribir_prometheus(ARCHIVO_PROMETHEUS)
+            except OSError as e:
+                logging.getLogger(__name__).warning("No se pudieron escribir las métricas: %s", e)
+
+        if st.session_state.get("es_admin"):
+            with st.sidebar.expander("Métricas de depuración"):
+                st.write(f"**Rerun actual:** {total_rerun * 1000:.1f} ms")
+                if tiempos_rerun:
+                    st.dataframe(pd.DataFrame(
+                        [(nombre, conteo, suma * 1000, maximo * 1000)
+                         for nombre, (conteo, suma, maximo) in tiempos_rerun.items()],
+                        columns=['Medición', 'Llamadas', 'Total (ms)', 'Máximo (ms)'],
+                    ).round(2), use_container_width=True, hide_index=True)
+                if contadores_rerun:
+                    st.table(pd.Series(contadores_rerun, name='Valor').rename_axis('Contador'))
+
+                tiempos_acumulados, _ = METRICAS.instantanea()
+                if tiempos_acumulados:
+                    st.write("**Acumulado del proceso**")
+                    st.dataframe(pd.DataFrame(
+                        [(nombre, conteo, suma / conteo * 1000, maximo * 1000)
+                         for nombre, (conteo, suma, maximo) in sorted(tiempos_acumulados.items())],
+                        columns=['Medición', 'Llamadas', 'Promedio (ms)', 'Máximo (ms)'],
+                    ).round(2), use_container_width=True, hide_index=True)
+                st.code(METRICAS.texto_prometheus(), language='text')
\ No newline at end of file
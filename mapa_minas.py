@@ -0,0 +1,160 @@
+"""Datos e índice espacial para el mapa de minas.
+
+Plantas.json se lee una sola vez y se guarda como DataFrame con las banderas
+Surface/Underground/Quarry como booleanos. Un índice de rejilla (celdas de
+TAMANO_CELDA grados) resuelve consultas por rectángulo y por radio sin
+recorrer todas las plantas, y agrupar_marcadores agrupa en el servidor las
+plantas visibles según el zoom, de modo que el navegador solo recibe un
+marcador por grupo.
+
+Las minas de Equipos_Mina se ligan a las plantas comparando nombres
+normalizados (sin acentos ni mayúsculas) contra PLANT_NAME y OPER_NAME.
+"""
+import json
+import math
+import os
+import unicodedata
+from collections import defaultdict
+
+import numpy as np
+import pandas as pd
+
+# Junto al módulo, para que funcione sin importar el directorio de trabajo
+RUTA_PLANTAS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'Plantas.json')
+
+TAMANO_CELDA = 0.5  # grados
+RADIO_TIERRA_KM = 6371.0
+
+# Banderas de tipo de operación en Plantas.json
+TIPOS_OPERACION = ['Surface', 'Underground', 'Quarry']
+
+
+def normalizar_nombre(texto):
+    texto = unicodedata.normalize('NFKD', str(texto))
+    return ''.join(c for c in texto if not unicodedata.combining(c)).lower().strip()
+
+
+def cargar_plantas(ruta=RUTA_PLANTAS):
+    """Lee Plantas.json y devuelve un DataFrame con coordenadas válidas."""
+    with open(ruta, encoding='utf-8') as f:
+        plantas = pd.DataFrame(json.load(f))
+    for tipo in TIPOS_OPERACION:
+        plantas[tipo] = plantas[tipo].astype(str).str.strip().str.lower().eq('si')
+    plantas['LATITUDE'] = pd.to_numeric(plantas['LATITUDE'], errors='coerce')
+    plantas['LONGITUDE'] = pd.to_numeric(plantas['LONGITUDE'], errors='coerce')
+    return plantas.dropna(subset=['LATITUDE', 'LONGITUDE']).reset_index(drop=True)
+
+
+def distancia_km(lat1, lon1, lat2, lon2):
+    """Distancia haversine; acepta arreglos de numpy en lat2/lon2."""
+    lat1, lon1, lat2, lon2 = map(np.radians, (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * RADIO_TIERRA_KM * np.arcsin(np.sqrt(a))
+
+
+class IndiceEspacial:
+    """Rejilla regular de celdas en grados sobre latitud/longitud."""
+
+    def __init__(self, latitudes, longitudes, tamano_celda=TAMANO_CELDA):
+        self.latitudes = np.asarray(latitudes, dtype=float)
+        self.longitudes = np.asarray(longitudes, dtype=float)
+        self.tamano_celda = tamano_celda
+        celdas = defaultdict(list)
+        for i, celda in enumerate(zip(self._celda(self.latitudes), self._celda(self.longitudes))):
+            celdas[celda].append(i)
+        self._celdas = {celda: np.array(ids) for celda, ids in celdas.items()}
+
+    def _celda(self, valor):
+        return np.floor(np.asarray(valor) / self.tamano_celda).astype(int)
+
+    def en_rectangulo(self, lat_min, lat_max, lon_min, lon_max):
+        """Ids de los puntos dentro del rectángulo (bordes incluidos)."""
+        fila_min, fila_max = self._celda(lat_min), self._celda(lat_max)
+        col_min, col_max = self._celda(lon_min), self._celda(lon_max)
+        if (fila_max - fila_min + 1) * (col_max - col_min + 1) > len(self._celdas):
+            # Rectángulo más grande que la rejilla ocupada: revisar solo celdas existentes
+            candidatas = [ids for (f, c), ids in self._celdas.items()
+                          if fila_min <= f <= fila_max and col_min <= c <= col_max]
+        else:
+            candidatas = [self._celdas[(f, c)] for f in range(fila_min, fila_max + 1)
+                          for c in range(col_min, col_max + 1) if (f, c) in self._celdas]
+        if not candidatas:
+            return np.array([], dtype=int)
+        ids = np.concatenate(candidatas)
+        lat, lon = self.latitudes[ids], self.longitudes[ids]
+        dentro = (lat >= lat_min) & (lat <= lat_max) & (lon >= lon_min) & (lon <= lon_max)
+        return np.sort(ids[dentro])
+
+    def en_radio(self, lat, lon, radio_km):
+        """Ids de los puntos a menos de radio_km del centro, ordenados por distancia."""
+        delta_lat = math.degrees(radio_km / RADIO_TIERRA_KM)
+        delta_lon = delta_lat / max(math.cos(math.radians(lat)), 1e-6)
+        ids = self.en_rectangulo(lat - delta_lat, lat + delta_lat, lon - delta_lon, lon + delta_lon)
+        distancias = distancia_km(lat, lon, self.latitudes[ids], self.longitudes[ids])
+        cerca = distancias <= radio_km
+        return ids[cerca][np.argsort(distancias[cerca], kind='stable')]
+
+
+def agrupar_marcadores(latitudes, longitudes, ids, zoom, pixeles_grupo=60):
+    """Agrupa los puntos `ids` en celdas de ~pixeles_grupo píxeles al zoom dado.
+
+    Devuelve una lista de (lat, lon, ids_del_grupo) con el centroide de cada grupo.
+    """
+    if len(ids) == 0:
+        return []
+    # Grados de longitud que ocupa un píxel en el zoom de Leaflet (teselas de 256 px)
+    grados = pixeles_grupo * 360.0 / (256 * 2 ** zoom)
+    ids = np.asarray(ids)
+    lat, lon = latitudes[ids], longitudes[ids]
+    claves = np.floor(lat / grados).astype(np.int64) * 1_000_003 + np.floor(lon / grados).astype(np.int64)
+    _, grupo, conteos = np.unique(claves, return_inverse=True, return_counts=True)
+    suma_lat = np.bincount(grupo, weights=lat)
+    suma_lon = np.bincount(grupo, weights=lon)
+    orden = np.argsort(grupo, kind='stable')
+    miembros = np.split(ids[orden], np.cumsum(conteos)[:-1])
+    return [(suma_lat[g] / conteos[g], suma_lon[g] / conteos[g], miembros[g]) for g in range(len(conteos))]
+
+
+def ligar_minas(plantas, minas):
+    """Mapea cada nombre de mina al índice de la planta que le corresponde (o lo omite)."""
+    nombres_planta = [normalizar_nombre(n) for n in plantas['PLANT_NAME']]
+    nombres_operador = [normalizar_nombre(n) for n in plantas['OPER_NAME']]
+    ligadas = {}
+    for mina in minas:
+        clave = normalizar_nombre(mina)
+        if not clave:
+            continue
+        for nombres in (nombres_planta, nombres_operador):
+            indice = next((i for i, nombre in enumerate(nombres) if clave in nombre), None)
+            if indice is not None:
+                ligadas[mina] = indice
+                break
+    return ligadas
+
+
+class MapaMinas:
+    """Plantas de Plantas.json con su índice espacial; se construye una vez por proceso."""
+
+    def __init__(self, ruta=RUTA_PLANTAS):
+        self.plantas = cargar_plantas(ruta)
+        self.indice = IndiceEspacial(self.plantas['LATITUDE'], self.plantas['LONGITUDE'])
+        self.estados = sorted(self.plantas['Estado'].dropna().unique())
+
+    def equipos_por_planta(self, df_equipos_mina):
+        """Total de 'No Equipos' de Equipos_Mina por planta (arreglo alineado con plantas)."""
+        totales = np.zeros(len(self.plantas))
+        if df_equipos_mina.empty or 'Mina' not in df_equipos_mina.columns:
+            return totales
+        por_mina = df_equipos_mina.groupby('Mina', observed=True)['No Equipos'].sum()
+        for mina, indice in ligar_minas(self.plantas, por_mina.index).items():
+            totales[indice] += por_mina[mina]
+        return totales
+
+    def filtrar(self, estados=None, tipos=None):
+        """Máscara booleana de plantas por estado y tipo de operación."""
+        mascara = np.ones(len(self.plantas), dtype=bool)
+        if estados:
+            mascara &= self.plantas['Estado'].isin(estados).to_numpy()
+        if tipos:
+            mascara &= self.plantas[list(tipos)].any(axis=1).to_numpy()
+        return mascara
@@ -0,0 +1,216 @@
+"""Medición opcional de las rutas calientes del catálogo.
+
+Con CATALOGO_METRICAS=1 en el entorno (o `METRICAS = true` en los secrets)
+se registran tiempos y contadores de la carga de datos, la construcción de
+derivados, los filtros, las búsquedas, los detalles y las imágenes (aciertos
+y fallos de caché, bytes enviados). Sin activarla, `medir` e `incrementar`
+no hacen nada más que revisar una bandera.
+
+Hay dos vistas de los datos:
+
+- acumulados por proceso (conteo, suma y máximo de cada tiempo, y cada
+  contador), que se exportan en el formato de texto de Prometheus y, con
+  CATALOGO_METRICAS_ARCHIVO, se escriben en un archivo para el textfile
+  collector de node_exporter;
+- los tiempos del rerun actual, guardados por hilo porque Streamlit ejecuta
+  cada rerun en su propio hilo, para el panel de depuración y una línea de
+  log por rerun.
+
+La línea por rerun va al logger 'catalogo.metricas', que tiene su propio
+handler a stderr con nivel INFO para que aparezca aunque la aplicación no
+configure logging; CATALOGO_METRICAS_LOG=0 la apaga.
+"""
+import logging
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+PREFIJO_PROMETHEUS = 'catalogo'
+
+_NO_PERMITIDO = re.compile(r'[^a-zA-Z0-9_]')
+
+
+def _nombre_prometheus(nombre):
+    return f"{PREFIJO_PROMETHEUS}_{_NO_PERMITIDO.sub('_', nombre)}"
+
+
+class Metricas:
+    """Tiempos y contadores acumulados por proceso y por rerun."""
+
+    def __init__(self, activa=False):
+        self.activa = activa
+        self._tiempos = {}
+        self._contadores = {}
+        self._lock = threading.Lock()
+        self._rerun = threading.local()
+
+    def _registrar_tiempo(self, nombre, segundos):
+        tiempos = getattr(self._rerun, 'tiempos', None)
+        with self._lock:
+            conteo, suma, maximo = self._tiempos.get(nombre, (0, 0.0, 0.0))
+            self._tiempos[nombre] = (conteo + 1, suma + segundos, max(maximo, segundos))
+            if tiempos is not None:
+                tiempos.append((nombre, segundos))
+
+    @contextmanager
+    def medir(self, nombre):
+        """Mide el bloque bajo `nombre`; no hace nada si la medición está apagada."""
+        if not self.activa:
+            yield
+            return
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._registrar_tiempo(nombre, time.perf_counter() - inicio)
+
+    def incrementar(self, nombre, cantidad=1):
+        if not self.activa:
+            return
+        contadores = getattr(self._rerun, 'contadores', None)
+        with self._lock:
+            self._contadores[nombre] = self._contadores.get(nombre, 0) + cantidad
+            if contadores is not None:
+                contadores[nombre] = contadores.get(nombre, 0) + cantidad
+
+    def rerun_actual(self):
+        """Tiempos y contadores del rerun de este hilo, para pasarlos a hilos de trabajo (None si no hay)."""
+        tiempos = getattr(self._rerun, 'tiempos', None)
+        if tiempos is None:
+            return None
+        return tiempos, self._rerun.contadores
+
+    @contextmanager
+    def en_rerun(self, rerun):
+        """Suma al rerun `rerun` (de rerun_actual) lo que se mida en este hilo durante el bloque.
+
+        Los hilos de un pool no son el del rerun; sin esto lo que miden solo
+        llega a los acumulados del proceso.
+        """
+        if rerun is None:
+            yield
+            return
+        self._rerun.tiempos, self._rerun.contadores = rerun
+        try:
+            yield
+        finally:
+            self._rerun.tiempos = self._rerun.contadores = None
+
+    def iniciar_rerun(self):
+        """Empieza a guardar los tiempos del rerun que corre en este hilo."""
+        self._rerun.tiempos = []
+        self._rerun.contadores = {}
+        self._rerun.inicio = time.perf_counter()
+
+    def terminar_rerun(self):
+        """Cierra el rerun de este hilo y devuelve (tiempos, contadores, duración total).
+
+        Los tiempos vienen agregados por nombre en orden de primera aparición,
+        {nombre: (conteo, suma, máximo)}: una cuadrícula mide cada tarjeta
+        por separado y no debe repetir la misma clave decenas de veces.
+        """
+        tiempos = getattr(self._rerun, 'tiempos', None)
+        if tiempos is None:
+            return {}, {}, 0.0
+        with self._lock:
+            contadores = dict(self._rerun.contadores)
+            tiempos = list(tiempos)
+        total = time.perf_counter() - self._rerun.inicio
+        self._rerun.tiempos = self._rerun.contadores = None
+        self._registrar_tiempo('rerun', total)
+
+        agregados = {}
+        for nombre, segundos in tiempos:
+            conteo, suma, maximo = agregados.get(nombre, (0, 0.0, 0.0))
+            agregados[nombre] = (conteo + 1, suma + segundos, max(maximo, segundos))
+        return agregados, contadores, total
+
+    def instantanea(self):
+        """Copia de los acumulados: ({nombre: (conteo, suma, máximo)}, {nombre: valor})."""
+        with self._lock:
+            return dict(self._tiempos), dict(self._contadores)
+
+    def texto_prometheus(self):
+        """Acumulados en el formato de exposición de texto de Prometheus."""
+        tiempos, contadores = self.instantanea()
+        lineas = []
+        for nombre, (conteo, suma, maximo) in sorted(tiempos.items()):
+            metrica = f"{_nombre_prometheus(nombre)}_segundos"
+            lineas += [
+                f"# TYPE {metrica} summary",
+                f"{metrica}_count {conteo}",
+                f"{metrica}_sum {suma:.6f}",
+                f"# TYPE {metrica}_max gauge",
+                f"{metrica}_max {maximo:.6f}",
+            ]
+        for nombre, valor in sorted(contadores.items()):
+            metrica = f"{_nombre_prometheus(nombre)}_total"
+            lineas += [f"# TYPE {metrica} counter", f"{metrica} {valor}"]
+        return '\n'.join(lineas) + '\n'
+
+    def escribir_prometheus(self, ruta):
+        """Escribe el texto de Prometheus de forma atómica (textfile collector)."""
+        temporal = f"{ruta}.{os.getpid()}.tmp"
+        with open(temporal, 'w', encoding='utf-8') as f:
+            f.write(self.texto_prometheus())
+        os.replace(temporal, ruta)
+
+
+def _activada_por_entorno():
+    return os.environ.get('CATALOGO_METRICAS', '').strip().lower() in ('1', 'true', 'si', 'sí')
+
+
+# Instancia compartida por todos los módulos del proceso
+METRICAS = Metricas(activa=_activada_por_entorno())
+
+logger = logging.getLogger('catalogo.metricas')
+if not logger.handlers:
+    _manejador = logging.StreamHandler()
+    _manejador.setFormatter(logging.Formatter('%(asctime)s %(name)s %(message)s'))
+    logger.addHandler(_manejador)
+    logger.propagate = False
+logger.setLevel(logging.INFO if os.environ.get('CATALOGO_METRICAS_LOG', '1').strip() != '0' else logging.WARNING)
+
+ARCHIVO_PROMETHEUS = os.environ.get('CATALOGO_METRICAS_ARCHIVO')
+
+
+def medir(nombre):
+    return METRICAS.medir(nombre)
+
+
+def incrementar(nombre, cantidad=1):
+    METRICAS.incrementar(nombre, cantidad)
+
+
+def medido(nombre):
+    """Decorador que mide cada llamada a la función bajo `nombre`."""
+    def decorador(funcion):
+        @wraps(funcion)
+        def envoltura(*args, **kwargs):
+            with METRICAS.medir(nombre):
+                return funcion(*args, **kwargs)
+        return envoltura
+    return decorador
+
+
+def linea_log(tiempos, contadores, total):
+    """Resumen de un rerun en una sola línea clave=valor, sin claves repetidas.
+
+    Cada medición da su tiempo total `<nombre>_ms`; si se midió más de una
+    vez se agregan `<nombre>_n` (llamadas) y `<nombre>_max_ms`.
+    """
+    partes = [f"rerun_ms={total * 1000:.1f}"]
+    for nombre, (conteo, suma, maximo) in tiempos.items():
+        partes.append(f"{nombre}_ms={suma * 1000:.1f}")
+        if conteo > 1:
+            partes += [f"{nombre}_n={conteo}", f"{nombre}_max_ms={maximo * 1000:.1f}"]
+    partes += [f"{nombre}={valor}" for nombre, valor in sorted(contadores.items())]
+    return ' '.join(partes)
+
+
+def registrar_rerun(tiempos, contadores, total):
+    """Escribe en el log la línea de resumen del rerun."""
+    logger.info(linea_log(tiempos, contadores, total))
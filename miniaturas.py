@@ -0,0 +1,323 @@
+"""Caché de miniaturas para las imágenes del catálogo.
+
+Las imágenes de ./images se guardan ya redimensionadas (a la altura de las
+tarjetas y a la del sidebar) en un directorio de caché en disco. Cada archivo
+se identifica por el nombre de la imagen, la altura y el mtime/tamaño del
+original, así que una imagen modificada genera una miniatura nueva. Delante
+del disco hay un LRU en memoria con presupuesto de bytes para que las
+tarjetas sirvan bytes JPEG sin decodificar nada en cada rerun.
+
+Los nombres, mtime y tamaño de ./images salen de un listado del directorio
+que se refresca cada INTERVALO_LISTADO segundos, no de un stat por tarjeta.
+`preparar` genera en un pool de hilos acotado las miniaturas que falten de
+una página antes de emitir los widgets, así que la página tarda lo que la
+imagen más lenta y no la suma de todas. Las imágenes que no existen o no se
+pueden decodificar (formato desconocido, archivo truncado) quedan anotadas en fallidas.json dentro de la caché y no
+se vuelven a intentar hasta que el archivo cambie.
+
+Para regenerar todas las miniaturas de una vez:
+
+    python miniaturas.py
+"""
+import argparse
+import hashlib
+import io
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image, UnidentifiedImageError
+
+from metricas import METRICAS, incrementar, medir
+
+DIRECTORIO_IMAGENES = './images'
+DIRECTORIO_CACHE = './.miniaturas'
+
+# Alturas a las que se sirven las imágenes
+ALTURA_TARJETA = 500
+ALTURA_SIDEBAR = 300
+ALTURAS = (ALTURA_TARJETA, ALTURA_SIDEBAR)
+
+# Presupuesto del LRU en memoria (bytes JPEG ya comprimidos)
+PRESUPUESTO_MEMORIA = 64 * 1024 * 1024
+
+CALIDAD_JPEG = 85
+
+# Hilos para generar miniaturas en paralelo
+HILOS_MINIATURAS = 4
+
+# Segundos entre relecturas del listado de ./images
+INTERVALO_LISTADO = 60.0
+
+ARCHIVO_FALLIDAS = 'fallidas.json'
+
+
+def redimensionar(ruta, altura):
+    """Abre la imagen en `ruta` y devuelve los bytes JPEG a la altura indicada."""
+    with Image.open(ruta) as image:
+        # Redimensionar la imagen manteniendo la relación de aspecto
+        aspect_ratio = image.width / image.height
+        new_width = max(1, int(altura * aspect_ratio))
+        resized_image = image.resize((new_width, altura))
+        if resized_image.mode != 'RGB':
+            resized_image = resized_image.convert('RGB')
+        buffer = io.BytesIO()
+        resized_image.save(buffer, format='JPEG', quality=CALIDAD_JPEG, optimize=True)
+        return buffer.getvalue()
+
+
+class CacheMiniaturas:
+    """Miniaturas en disco con un LRU en memoria acotado por bytes."""
+
+    def __init__(self, directorio_imagenes=DIRECTORIO_IMAGENES, directorio_cache=DIRECTORIO_CACHE,
+                 presupuesto_bytes=PRESUPUESTO_MEMORIA):
+        self.directorio_imagenes = directorio_imagenes
+        self.directorio_cache = directorio_cache
+        self.presupuesto_bytes = presupuesto_bytes
+        self._memoria = OrderedDict()
+        self._bytes_en_memoria = 0
+        self._lock = threading.Lock()
+        self._pool = None
+        self._listado = {}
+        self._listado_en = None
+        self._fallidas = self._leer_fallidas()
+
+    def _leer_listado(self):
+        """Nombre -> (mtime_ns, tamaño) de los archivos de ./images."""
+        listado = {}
+        try:
+            with os.scandir(self.directorio_imagenes) as entradas:
+                for entrada in entradas:
+                    if entrada.is_file():
+                        stat = entrada.stat()
+                        listado[entrada.name] = (stat.st_mtime_ns, stat.st_size)
+        except FileNotFoundError:
+            pass
+        return listado
+
+    def listado(self, refrescar=False):
+        """Listado del directorio de imágenes, releído como máximo cada INTERVALO_LISTADO."""
+        ahora = time.monotonic()
+        if refrescar or self._listado_en is None or ahora - self._listado_en > INTERVALO_LISTADO:
+            listado = self._leer_listado()
+            with self._lock:
+                self._listado, self._listado_en = listado, ahora
+        return self._listado
+
+    def _ruta_fallidas(self):
+        return os.path.join(self.directorio_cache, ARCHIVO_FALLIDAS)
+
+    def _leer_fallidas(self):
+        try:
+            with open(self._ruta_fallidas(), encoding='utf-8') as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def _anotar_fallida(self, nombre_imagen, firma, motivo):
+        """Anota la imagen en fallidas.json; firma None significa que no existe.
+
+        Con motivo None se quita la anotación (la imagen ya se pudo leer).
+        """
+        with self._lock:
+            entrada = {'firma': list(firma) if firma else None, 'motivo': motivo}
+            if motivo is None:
+                if self._fallidas.pop(nombre_imagen, None) is None:
+                    return
+            elif self._fallidas.get(nombre_imagen) == entrada:
+                return
+            else:
+                self._fallidas[nombre_imagen] = entrada
+            fallidas = dict(self._fallidas)
+        os.makedirs(self.directorio_cache, exist_ok=True)
+        temporal = f"{self._ruta_fallidas()}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temporal, 'w', encoding='utf-8') as f:
+            json.dump(fallidas, f, ensure_ascii=False, indent=2)
+        os.replace(temporal, self._ruta_fallidas())
+
+    def fallidas(self):
+        """Copia de las imágenes anotadas como faltantes o dañadas."""
+        with self._lock:
+            return dict(self._fallidas)
+
+    @staticmethod
+    def _clave(nombre_imagen, altura, firma):
+        base = f"{nombre_imagen}|{altura}|{firma[0]}|{firma[1]}"
+        return hashlib.sha1(base.encode('utf-8')).hexdigest()
+
+    def clave(self, nombre_imagen, altura):
+        """Clave de la miniatura; lanza FileNotFoundError si la imagen no está en el listado."""
+        firma = self.listado().get(nombre_imagen)
+        if firma is None:
+            raise FileNotFoundError(nombre_imagen)
+        return self._clave(nombre_imagen, altura, firma)
+
+    def _ruta_cache(self, clave):
+        return os.path.join(self.directorio_cache, f"{clave}.jpg")
+
+    def _guardar_en_memoria(self, clave, datos):
+        with self._lock:
+            if clave in self._memoria:
+                self._memoria.move_to_end(clave)
+                return
+            if len(datos) > self.presupuesto_bytes:
+                return
+            self._memoria[clave] = datos
+            self._bytes_en_memoria += len(datos)
+            while self._bytes_en_memoria > self.presupuesto_bytes:
+                _, descartado = self._memoria.popitem(last=False)
+                self._bytes_en_memoria -= len(descartado)
+
+    def _escribir_en_disco(self, clave, datos):
+        os.makedirs(self.directorio_cache, exist_ok=True)
+        ruta = self._ruta_cache(clave)
+        # Escritura atómica para que otro hilo nunca lea un archivo a medias
+        temporal = f"{ruta}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temporal, 'wb') as f:
+            f.write(datos)
+        os.replace(temporal, ruta)
+
+    def obtener(self, nombre_imagen, altura=ALTURA_TARJETA):
+        """Devuelve los bytes JPEG de la miniatura o None si la imagen no existe.
+
+        Si la imagen no se puede decodificar se propaga OSError (o su subclase
+        UnidentifiedImageError), también en las siguientes llamadas mientras
+        el archivo no cambie.
+        """
+        firma = self.listado().get(nombre_imagen)
+        if firma is None:
+            if isinstance(nombre_imagen, str):
+                self._anotar_fallida(nombre_imagen, None, "No existe")
+            return None
+        clave = self._clave(nombre_imagen, altura, firma)
+
+        with self._lock:
+            datos = self._memoria.get(clave)
+            if datos is not None:
+                self._memoria.move_to_end(clave)
+                incrementar('miniaturas_acierto_memoria')
+                return datos
+
+        ruta = self._ruta_cache(clave)
+        try:
+            with open(ruta, 'rb') as f:
+                datos = f.read()
+            incrementar('miniaturas_acierto_disco')
+        except FileNotFoundError:
+            # La miniatura no se ha generado todavía: generarla una sola vez
+            fallida = self._fallidas.get(nombre_imagen)
+            if fallida is not None and fallida['firma'] == list(firma):
+                incrementar('miniaturas_fallida_conocida')
+                raise UnidentifiedImageError(fallida['motivo'])
+            incrementar('miniaturas_fallo')
+            try:
+                with medir('redimensionar'):
+                    datos = redimensionar(os.path.join(self.directorio_imagenes, nombre_imagen), altura)
+            except OSError as e:
+                # Formato desconocido o archivo truncado ("image file is truncated")
+                self._anotar_fallida(nombre_imagen, firma, str(e))
+                raise
+            self._escribir_en_disco(clave, datos)
+            if fallida is not None:
+                self._anotar_fallida(nombre_imagen, firma, None)
+
+        self._guardar_en_memoria(clave, datos)
+        return datos
+
+    def _obtener_o_error(self, nombre_imagen, altura, rerun):
+        # Corre en un hilo del pool: lo que mide obtener se suma al rerun que pidió la página
+        with METRICAS.en_rerun(rerun):
+            try:
+                return self.obtener(nombre_imagen, altura)
+            except OSError:
+                return None
+
+    def preparar(self, nombres_imagen, altura=ALTURA_TARJETA):
+        """Deja en el LRU las miniaturas de una página, generando las que falten en paralelo.
+
+        Las que ya están en memoria no pasan por el pool; los errores quedan
+        anotados y se vuelven a lanzar al pedir la imagen con `obtener`.
+        """
+        listado = self.listado()
+        pendientes = []
+        for nombre_imagen in dict.fromkeys(nombres_imagen):
+            firma = listado.get(nombre_imagen)
+            if firma is None:
+                # Faltante: obtener la anota sin pasar por el pool
+                self.obtener(nombre_imagen, altura)
+                continue
+            with self._lock:
+                if self._clave(nombre_imagen, altura, firma) in self._memoria:
+                    continue
+            pendientes.append(nombre_imagen)
+        if not pendientes:
+            return
+
+        with medir('preparar_imagenes'):
+            if self._pool is None:
+                with self._lock:
+                    if self._pool is None:
+                        self._pool = ThreadPoolExecutor(HILOS_MINIATURAS, thread_name_prefix='miniaturas')
+            rerun = METRICAS.rerun_actual()
+            list(self._pool.map(lambda nombre: self._obtener_o_error(nombre, altura, rerun), pendientes))
+
+    def construir(self, alturas=ALTURAS, limpiar=True):
+        """Genera en bloque las miniaturas que falten y borra las obsoletas.
+
+        Devuelve un diccionario con el número de miniaturas generadas, las que
+        ya existían, las imágenes con error y los archivos obsoletos borrados.
+        """
+        os.makedirs(self.directorio_cache, exist_ok=True)
+        resumen = {'generadas': 0, 'existentes': 0, 'errores': [], 'borradas': 0}
+        vigentes = set()
+
+        for nombre_imagen in sorted(self.listado(refrescar=True)):
+            ruta = os.path.join(self.directorio_imagenes, nombre_imagen)
+            for altura in alturas:
+                clave = self.clave(nombre_imagen, altura)
+                vigentes.add(f"{clave}.jpg")
+                if os.path.exists(self._ruta_cache(clave)):
+                    resumen['existentes'] += 1
+                    continue
+                try:
+                    datos = redimensionar(ruta, altura)
+                except OSError as e:
+                    resumen['errores'].append((nombre_imagen, str(e)))
+                    self._anotar_fallida(nombre_imagen, self._listado[nombre_imagen], str(e))
+                    continue
+                try:
+                    self._escribir_en_disco(clave, datos)
+                    resumen['generadas'] += 1
+                except OSError as e:
+                    resumen['errores'].append((nombre_imagen, str(e)))
+
+        if limpiar:
+            for archivo in os.listdir(self.directorio_cache):
+                if archivo.endswith('.jpg') and archivo not in vigentes:
+                    os.remove(os.path.join(self.directorio_cache, archivo))
+                    resumen['borradas'] += 1
+
+        return resumen
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Regenera la caché de miniaturas del catálogo.")
+    parser.add_argument('--imagenes', default=DIRECTORIO_IMAGENES, help="Directorio de imágenes originales")
+    parser.add_argument('--cache', default=DIRECTORIO_CACHE, help="Directorio de la caché de miniaturas")
+    parser.add_argument('--sin-limpiar', action='store_true', help="No borrar miniaturas obsoletas")
+    args = parser.parse_args()
+
+    cache = CacheMiniaturas(args.imagenes, args.cache)
+    resumen = cache.construir(limpiar=not args.sin_limpiar)
+    print(f"Miniaturas generadas: {resumen['generadas']}")
+    print(f"Miniaturas existentes: {resumen['existentes']}")
+    print(f"Miniaturas obsoletas borradas: {resumen['borradas']}")
+    for nombre_imagen, error in resumen['errores']:
+        print(f"Error al procesar {nombre_imagen}: {error}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,275 @@
+"""Sincronización incremental de las tablas del catálogo.
+
+Un hilo en segundo plano revisa cada INTERVALO_SINCRONIZACION segundos si
+alguna tabla cambió en la base de datos:
+
+- Si la tabla tiene una columna de fecha de actualización y llave primaria,
+  la firma es (COUNT(*), MAX(columna)) y solo se traen las filas
+  modificadas desde la última sincronización, que se aplican sobre el
+  DataFrame en memoria. Si el conteo no cuadra después (hubo borrados) se
+  recarga esa tabla completa.
+- Si no, la firma es (COUNT(*), CHECKSUM TABLE) y una tabla cambiada se
+  recarga completa, sin tocar las demás.
+
+Cada tabla se publica con el esquema de esquema.py (categorías, códigos
+normalizados, enteros), venga de la base, del snapshot o de un CSV.
+
+Al arrancar desde la base de datos algunas tablas pueden seguir cargándose:
+se publican vacías y marcadas como pendientes, la sincronización no las
+toca, y cada una se publica con sus derivados en cuanto llega (`recibir`).
+
+Las estructuras derivadas (vista del catálogo, índices) se registran con
+las tablas o derivados de los que dependen y solo se reconstruyen las
+afectadas. Todo se arma fuera del hilo de la página y se publica de golpe
+como un nuevo EstadoCatalogo, así que una sesión nunca ve datos a medias ni
+espera a la recarga.
+"""
+import logging
+import threading
+from dataclasses import dataclass, field, replace
+from functools import partial
+
+import pandas as pd
+
+from conexion import TABLAS
+from esquema import COLUMNAS_ACTUALIZACION, tipar_tabla
+
+logger = logging.getLogger(__name__)
+
+INTERVALO_SINCRONIZACION = 15.0
+
+# Espera máxima entre reintentos mientras la base de datos no responde
+INTERVALO_MAXIMO_REINTENTO = 300.0
+
+
+@dataclass(frozen=True)
+class EstadoCatalogo:
+    """Versión publicada de las tablas y sus derivados; no se modifica.
+
+    `origen` indica de dónde vienen los datos: 'db' si ya se validaron contra
+    la base de datos, o 'snapshot'/'csv' mientras no se haya podido.
+    `pendientes` son las tablas que todavía se están cargando (vacías).
+    """
+    version: int
+    tablas: dict
+    derivados: dict = field(default_factory=dict)
+    origen: str = 'db'
+    pendientes: frozenset = frozenset()
+
+    def __getitem__(self, nombre):
+        if nombre in self.tablas:
+            return self.tablas[nombre]
+        return self.derivados[nombre]
+
+
+def aplicar_delta(df, delta, clave):
+    """Inserta o reemplaza en df las filas de delta según la llave primaria.
+
+    Las filas existentes conservan su posición y las nuevas se agregan al final.
+    Las columnas categóricas vuelven a su tipo base para admitir valores
+    nuevos; el resultado se vuelve a tipar al publicarlo.
+    """
+    if delta.empty:
+        return df
+    if df.empty:
+        return delta.reset_index(drop=True)
+    df = df.astype({columna: df[columna].cat.categories.dtype for columna in df.columns
+                    if isinstance(df[columna].dtype, pd.CategoricalDtype)})
+    base = df.set_index(clave, drop=False)
+    cambios = delta.reindex(columns=df.columns).set_index(clave, drop=False)
+    comunes = cambios.index.intersection(base.index)
+    if len(comunes):
+        base.loc[comunes] = cambios.loc[comunes]
+    nuevas = cambios.loc[~cambios.index.isin(base.index)]
+    return pd.concat([base, nuevas]).reset_index(drop=True)
+
+
+class SincronizadorCatalogo:
+    """Mantiene las tablas y sus derivados al día con la base de datos."""
+
+    def __init__(self, gestor, tablas, intervalo=INTERVALO_SINCRONIZACION, firmas=None, origen='db',
+                 al_publicar=None, pendientes=(), manifest=None):
+        self.gestor = gestor
+        # Manifest del snapshot con el que se arrancó (None si no fue desde un snapshot)
+        self.manifest = manifest
+        self.intervalo = intervalo
+        self.al_publicar = al_publicar
+        self._derivados = []
+        self._estado = EstadoCatalogo(0, {tabla: tipar_tabla(tabla, df) for tabla, df in zip(TABLAS, tablas)},
+                                      origen=origen, pendientes=frozenset(pendientes))
+        self._firmas = {tabla: tuple(firma) for tabla, firma in (firmas or {}).items()}
+        self._esquemas = {}
+        self._lock = threading.Lock()
+        self._detener = threading.Event()
+        self._hilo = None
+
+    @property
+    def estado(self):
+        return self._estado
+
+    @property
+    def firmas(self):
+        return dict(self._firmas)
+
+    def registrar(self, nombre, funcion, dependencias):
+        """Registra un derivado calculado como funcion(estado) a partir de sus dependencias.
+
+        Los derivados se reconstruyen en orden de registro, así que uno puede
+        depender de otro registrado antes.
+        """
+        self._derivados.append((nombre, funcion, tuple(dependencias)))
+        estado = self._estado
+        derivados = dict(estado.derivados)
+        derivados[nombre] = funcion(replace(estado, derivados=derivados))
+        self._estado = replace(estado, derivados=derivados)
+
+    def _esquema(self, tabla):
+        """Llave primaria y columna de actualización de la tabla (o None)."""
+        if tabla not in self._esquemas:
+            llaves = self.gestor.consultar(f"SHOW KEYS FROM {tabla} WHERE Key_name = 'PRIMARY'")
+            clave = list(llaves['Column_name']) if not llaves.empty else None
+            columnas = self.gestor.consultar(f"SHOW COLUMNS FROM {tabla}")
+            columna = next((c for c in COLUMNAS_ACTUALIZACION if c in set(columnas['Field'])), None)
+            self._esquemas[tabla] = (clave, columna)
+        return self._esquemas[tabla]
+
+    def _firma(self, tabla):
+        """(filas, marca) con la marca como texto para poder guardarla en el snapshot."""
+        clave, columna = self._esquema(tabla)
+        if columna is not None:
+            fila = self.gestor.consultar(f"SELECT COUNT(*) AS n, MAX({columna}) AS m FROM {tabla}").iloc[0]
+            n, marca = fila['n'], fila['m']
+        else:
+            n = self.gestor.consultar(f"SELECT COUNT(*) AS n FROM {tabla}").iloc[0]['n']
+            marca = self.gestor.consultar(f"CHECKSUM TABLE {tabla}").iloc[0]['Checksum']
+        return int(n), None if pd.isna(marca) else str(marca)
+
+    def _actualizar_tabla(self, tabla, df, firma_anterior, firma):
+        clave, columna = self._esquema(tabla)
+        if clave and columna and firma_anterior is not None and firma_anterior[1] is not None:
+            # Solo las filas modificadas desde la última firma (>= por empates en el mismo segundo)
+            delta = self.gestor.cargar_tabla(tabla, f"{columna} >= %s", (firma_anterior[1],))
+            actualizado = aplicar_delta(df, delta, clave)
+            if len(actualizado) == firma[0]:
+                logger.info("Tabla %s: %d filas actualizadas", tabla, len(delta))
+                return actualizado
+        logger.info("Tabla %s: recarga completa", tabla)
+        return self.gestor.cargar_tabla(tabla)
+
+    def sincronizar(self):
+        """Revisa todas las tablas y publica un nuevo estado si alguna cambió.
+
+        Devuelve el conjunto de tablas y derivados que se actualizaron.
+        """
+        with self._lock:
+            estado = self._estado
+            tablas = dict(estado.tablas)
+            cambiados = set()
+            firmas_nuevas = False
+
+            for tabla in TABLAS:
+                if tabla in estado.pendientes:
+                    continue
+                firma = self._firma(tabla)
+                firma_anterior = self._firmas.get(tabla)
+                if firma_anterior is None and estado.origen == 'db' and len(tablas[tabla]) == firma[0]:
+                    # Primera revisión de datos recién leídos de la base: corresponden a esta firma
+                    self._firmas[tabla] = firma
+                    firmas_nuevas = True
+                    continue
+                if firma == firma_anterior:
+                    continue
+                tablas[tabla] = tipar_tabla(tabla, self._actualizar_tabla(tabla, tablas[tabla], firma_anterior, firma))
+                self._firmas[tabla] = firma
+                cambiados.add(tabla)
+
+            if not cambiados and not firmas_nuevas and estado.origen == 'db':
+                return cambiados
+
+            # Aunque nada haya cambiado, los datos ya quedaron validados contra la base
+            self._publicar(estado, tablas, cambiados, estado.pendientes)
+            return cambiados
+
+    def _publicar(self, estado, tablas, cambiados, pendientes, origen='db'):
+        """Reconstruye los derivados afectados por `cambiados` y publica el nuevo estado.
+
+        Se llama con el lock tomado; agrega a `cambiados` los derivados reconstruidos.
+        """
+        derivados = dict(estado.derivados)
+        for nombre, funcion, dependencias in self._derivados:
+            if cambiados.intersection(dependencias):
+                derivados[nombre] = funcion(EstadoCatalogo(estado.version + 1, tablas, derivados, origen, pendientes))
+                cambiados.add(nombre)
+
+        self._estado = EstadoCatalogo(estado.version + 1, tablas, derivados, origen, pendientes)
+        # El snapshot solo se guarda con todas las tablas completas
+        if self.al_publicar is not None and not pendientes:
+            self.al_publicar(self._estado, self.firmas)
+
+    def completar(self, tabla, df):
+        """Publica una tabla pendiente que terminó de cargarse; df None si la carga falló.
+
+        Si falló, la tabla deja de estar pendiente y la siguiente sincronización
+        la recarga completa.
+        """
+        with self._lock:
+            estado = self._estado
+            tablas = dict(estado.tablas)
+            cambiados = set()
+            if df is not None:
+                tablas[tabla] = tipar_tabla(tabla, df)
+                cambiados.add(tabla)
+            self._publicar(estado, tablas, cambiados, estado.pendientes - {tabla}, estado.origen)
+
+    def _al_terminar_carga(self, tabla, futuro):
+        try:
+            df = futuro.result()
+        except Exception:
+            logger.exception("Error al cargar la tabla %s", tabla)
+            df = None
+        self.completar(tabla, df)
+
+    def recibir(self, futuros):
+        """Publica cada tabla de `futuros` ({tabla: Future}) en cuanto termine de cargarse."""
+        for tabla, futuro in futuros.items():
+            futuro.add_done_callback(partial(self._al_terminar_carga, tabla))
+
+    def _bucle(self, inmediato):
+        """Sincroniza cada `intervalo` segundos.
+
+        Mientras la base de datos falle (se está usando el snapshot o los
+        CSV) la espera se duplica hasta INTERVALO_MAXIMO_REINTENTO; el primer
+        error se registra con su traceback y los siguientes en una línea.
+        """
+        espera = 0 if inmediato else self.intervalo
+        fallos = 0
+        while not self._detener.wait(espera):
+            try:
+                self.sincronizar()
+            except Exception as e:
+                fallos += 1
+                espera = min(self.intervalo * 2 ** fallos, INTERVALO_MAXIMO_REINTENTO)
+                if fallos == 1:
+                    logger.exception("Error al sincronizar el catálogo; se reintentará en %.0f s", espera)
+                else:
+                    logger.warning("La sincronización sigue fallando (%d intentos, próximo en %.0f s): %s",
+                                   fallos, espera, e)
+            else:
+                if fallos:
+                    logger.info("Sincronización restablecida después de %d intentos fallidos", fallos)
+                fallos = 0
+                espera = self.intervalo
+
+    def iniciar(self, inmediato=False):
+        """Arranca el hilo de sincronización en segundo plano (una sola vez).
+
+        Con inmediato=True la primera revisión se hace en cuanto arranca el
+        hilo, para revalidar cuanto antes datos que no vienen de la base.
+        """
+        if self._hilo is None:
+            self._hilo = threading.Thread(target=self._bucle, args=(inmediato,), name="sincronizacion-catalogo",
+                                          daemon=True)
+            self._hilo.start()
+
+    def detener(self):
+        self._detener.set()
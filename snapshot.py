@@ -0,0 +1,123 @@
+"""Snapshot local de las tablas del catálogo en Parquet.
+
+Después de cada carga o sincronización correcta con la base de datos se
+escriben las cinco tablas en data/snapshot/ con el esquema de esquema.py
+(el mismo con el que se publican en memoria) y un manifest.json con:
+
+- la versión del formato, para descartar snapshots de otra versión,
+- la fecha de creación, para avisar cuando el snapshot es viejo,
+- filas, columnas y sha1 de cada archivo, para detectar archivos dañados,
+- las firmas de sincronización de cada tabla, para que al arrancar desde el
+  snapshot solo se traigan de la base de datos los cambios posteriores.
+
+Un snapshot que no pasa la validación lanza SnapshotInvalido con el motivo,
+nunca se usa en silencio.
+"""
+import datetime
+import hashlib
+import json
+import os
+
+import pandas as pd
+
+from conexion import TABLAS
+from esquema import tipar_tabla
+
+DIRECTORIO_SNAPSHOT = './data/snapshot'
+VERSION_FORMATO = 2
+
+# Antigüedad a partir de la cual se avisa que el snapshot puede estar desactualizado
+ANTIGUEDAD_MAXIMA = datetime.timedelta(hours=24)
+
+
+class SnapshotInvalido(Exception):
+    """El snapshot no existe, está incompleto o es de otra versión."""
+
+
+def _sha1(ruta):
+    h = hashlib.sha1()
+    with open(ruta, 'rb') as f:
+        for bloque in iter(lambda: f.read(1 << 20), b''):
+            h.update(bloque)
+    return h.hexdigest()
+
+
+def _ruta(directorio, tabla):
+    return os.path.join(directorio, f"{tabla}.parquet")
+
+
+def guardar_snapshot(tablas, firmas=None, directorio=DIRECTORIO_SNAPSHOT):
+    """Escribe las tablas y su manifest; devuelve el manifest escrito."""
+    os.makedirs(directorio, exist_ok=True)
+    manifest = {
+        'version_formato': VERSION_FORMATO,
+        'creado': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        'tablas': {},
+        'firmas': firmas or {},
+    }
+    for tabla in TABLAS:
+        df = tablas[tabla]
+        ruta = _ruta(directorio, tabla)
+        temporal = f"{ruta}.tmp"
+        tipar_tabla(tabla, df).to_parquet(temporal, index=False)
+        os.replace(temporal, ruta)
+        manifest['tablas'][tabla] = {
+            'filas': len(df),
+            'columnas': [str(c) for c in df.columns],
+            'sha1': _sha1(ruta),
+        }
+
+    # El manifest se escribe al final: solo describe archivos ya completos
+    ruta_manifest = os.path.join(directorio, 'manifest.json')
+    with open(f"{ruta_manifest}.tmp", 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    os.replace(f"{ruta_manifest}.tmp", ruta_manifest)
+    return manifest
+
+
+def leer_manifest(directorio=DIRECTORIO_SNAPSHOT):
+    """Lee el manifest del snapshot; lanza SnapshotInvalido si falta o está dañado."""
+    ruta_manifest = os.path.join(directorio, 'manifest.json')
+    try:
+        with open(ruta_manifest, encoding='utf-8') as f:
+            manifest = json.load(f)
+    except FileNotFoundError:
+        raise SnapshotInvalido("No existe un snapshot local")
+    except json.JSONDecodeError as e:
+        raise SnapshotInvalido(f"Manifest dañado: {e}")
+    return manifest
+
+
+def cargar_snapshot(directorio=DIRECTORIO_SNAPSHOT):
+    """Devuelve (lista de DataFrames en el orden de TABLAS, manifest).
+
+    Lanza SnapshotInvalido si falta el manifest, es de otra versión o algún
+    archivo no coincide con lo que describe.
+    """
+    manifest = leer_manifest(directorio)
+    if manifest.get('version_formato') != VERSION_FORMATO:
+        raise SnapshotInvalido(f"Versión de snapshot {manifest.get('version_formato')} distinta de {VERSION_FORMATO}")
+
+    tablas = []
+    for tabla in TABLAS:
+        info = manifest.get('tablas', {}).get(tabla)
+        ruta = _ruta(directorio, tabla)
+        if info is None or not os.path.exists(ruta):
+            raise SnapshotInvalido(f"Falta la tabla {tabla} en el snapshot")
+        if _sha1(ruta) != info['sha1']:
+            raise SnapshotInvalido(f"El archivo de {tabla} no coincide con el manifest")
+        df = pd.read_parquet(ruta)
+        if len(df) != info['filas'] or [str(c) for c in df.columns] != info['columnas']:
+            raise SnapshotInvalido(f"La tabla {tabla} no coincide con el manifest")
+        tablas.append(df)
+    return tablas, manifest
+
+
+def antiguedad(manifest):
+    """Tiempo transcurrido desde que se creó el snapshot."""
+    creado = datetime.datetime.fromisoformat(manifest['creado'])
+    return datetime.datetime.now(datetime.timezone.utc) - creado
+
+
+def esta_desactualizado(manifest, maxima=ANTIGUEDAD_MAXIMA):
+    return antiguedad(manifest) > maxima
@@ -0,0 +1,64 @@
+"""Pruebas de regresión de las estructuras derivadas con tablas vacías o pendientes.
+
+Las tablas sintéticas salen de benchmark.generar_datos a escala 1x.
+
+    python -m pytest test_derivados.py
+"""
+import pandas as pd
+import pytest
+
+from benchmark import generar_datos
+from conexion import TABLAS
+from detalles import IndiceDetalles
+from indice_llantas import IndiceLlantas
+from mapa_minas import MapaMinas
+from sincronizacion import SincronizadorCatalogo
+from vista_catalogo import VistaCatalogo
+
+HIJAS = ('Valvulas', 'Rines', 'Equipos_Mina')
+
+
+@pytest.fixture(scope='module')
+def tablas():
+    return generar_datos(1)
+
+
+@pytest.mark.parametrize('vacias', [['Valvulas'], ['Rines'], ['Equipos_Mina'], list(HIJAS)])
+def test_indice_detalles_con_tablas_hijas_vacias(tablas, vacias):
+    # CSV faltante: la tabla llega como un DataFrame sin columnas
+    vista = VistaCatalogo(tablas['Modelos'], tablas['llantas'])
+    hijas = {tabla: pd.DataFrame() if tabla in vacias else tablas[tabla] for tabla in HIJAS}
+    indice = IndiceDetalles(vista.catalogo, hijas['Valvulas'], hijas['Rines'], hijas['Equipos_Mina'])
+
+    equipo = tablas['Modelos']['Equipment Description'].iloc[0]
+    consultas = {'Valvulas': indice.valvulas_de, 'Rines': indice.rines_de, 'Equipos_Mina': indice.minas_de}
+    for tabla in vacias:
+        assert consultas[tabla](equipo) is None
+
+
+def test_arranque_con_tablas_diferidas(tablas):
+    # Como main.py sin snapshot: Modelos y llantas primero, el resto pendiente
+    iniciales = ('Modelos', 'llantas')
+    diferidas = [tabla for tabla in TABLAS if tabla not in iniciales]
+    mapa_minas = MapaMinas()
+
+    sincronizador = SincronizadorCatalogo(None, [tablas[t] if t in iniciales else pd.DataFrame() for t in TABLAS],
+                                          pendientes=diferidas)
+    sincronizador.registrar('vista_catalogo', lambda e: VistaCatalogo(e['Modelos'], e['llantas']), iniciales)
+    sincronizador.registrar('indice_llantas', lambda e: IndiceLlantas(e['llantas']), ['llantas'])
+    sincronizador.registrar('indice_detalles', lambda e: IndiceDetalles(e['vista_catalogo'].catalogo, e['Valvulas'],
+                                                                        e['Rines'], e['Equipos_Mina']),
+                            ['vista_catalogo', 'Valvulas', 'Rines', 'Equipos_Mina'])
+    sincronizador.registrar('equipos_por_planta', lambda e: mapa_minas.equipos_por_planta(e['Equipos_Mina']),
+                            ['Equipos_Mina'])
+
+    equipo = tablas['Valvulas']['Equipment Description'].iloc[0]
+    assert sincronizador.estado.pendientes == frozenset(diferidas)
+    assert sincronizador.estado['indice_detalles'].valvulas_de(equipo) is None
+    assert sincronizador.estado['equipos_por_planta'].sum() == 0
+
+    for tabla in diferidas:
+        sincronizador.completar(tabla, tablas[tabla])
+    estado = sincronizador.estado
+    assert not estado.pendientes
+    assert estado['indice_detalles'].valvulas_de(equipo) is not None
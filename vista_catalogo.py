@@ -0,0 +1,93 @@
+"""Vista del catálogo: modelos unidos con sus llantas agrupadas.
+
+La unión de df_modelos con las descripciones y códigos de llanta agrupados
+por 'Equipment Description' se construye una sola vez por versión de los
+datos. Junto a ella se guardan las opciones de los filtros, un DataFrame
+compacto con 'Tipo' y 'Fabricante' categóricos, para que los filtros de la
+pestaña de modelos comparen códigos enteros en lugar de cadenas, y el motor
+de búsqueda por trigramas que ordena los resultados por relevancia.
+"""
+import numpy as np
+import pandas as pd
+
+from busqueda_modelos import MotorBusqueda
+
+# Columnas de df_llantas que se concatenan por equipo
+COLUMNAS_LLANTAS = ['Desc Michelin', 'Desc MAXAM', 'CAI', 'MAXAM']
+
+
+def unir_por_equipo(equipos, valores, separador=', '):
+    """Series equipo -> valores de ese equipo unidos con `separador`, en orden de aparición.
+
+    Los grupos salen de ordenar una sola vez los códigos de equipo, sin crear
+    una Series por grupo.
+    """
+    codigos, unicos = pd.factorize(equipos)
+    orden = np.argsort(codigos, kind='stable')
+    grupos = np.split(np.asarray(valores, dtype=object)[orden], np.flatnonzero(np.diff(codigos[orden])) + 1)
+    unidos = [separador.join(grupo) for grupo in grupos] if len(orden) else []
+    return pd.Series(unidos, index=pd.Index(unicos, name='Equipment Description'), dtype=object)
+
+
+def agrupar_llantas(df_llantas):
+    """Une los valores distintos de cada columna de llanta con ', ' por equipo.
+
+    La eliminación de nulos y duplicados se hace de forma vectorizada sobre
+    toda la tabla y la unión por equipo con unir_por_equipo.
+    """
+    agrupadas = []
+    for columna in COLUMNAS_LLANTAS:
+        if columna not in df_llantas.columns:
+            continue
+        sub = df_llantas[['Equipment Description', columna]].dropna()
+        sub = sub.astype({columna: str}).drop_duplicates()
+        agrupadas.append(unir_por_equipo(sub['Equipment Description'], sub[columna]).rename(columna))
+
+    if not agrupadas:
+        return pd.DataFrame(columns=['Equipment Description'] + COLUMNAS_LLANTAS)
+    return pd.concat(agrupadas, axis=1).reindex(columns=COLUMNAS_LLANTAS).rename_axis('Equipment Description').reset_index()
+
+
+def _opciones(serie):
+    return [valor for valor in serie.unique() if pd.notna(valor)]
+
+
+class VistaCatalogo:
+    """Catálogo agrupado con opciones de filtro y columnas de filtrado compactas."""
+
+    def __init__(self, df_modelos, df_llantas):
+        self.catalogo = df_modelos.merge(agrupar_llantas(df_llantas), on='Equipment Description', how='left')
+
+        # Opciones únicas para los filtros, en orden de aparición
+        self.tipos = _opciones(self.catalogo['Tipo'])
+        self.fabricantes = _opciones(self.catalogo['Fabricante'])
+
+        # Columnas de filtrado codificadas como categorías
+        self.filtros = pd.DataFrame({
+            'Tipo': pd.Categorical(self.catalogo['Tipo'], categories=self.tipos),
+            'Fabricante': pd.Categorical(self.catalogo['Fabricante'], categories=self.fabricantes),
+        }, index=self.catalogo.index)
+
+        # Búsqueda tolerante a errores sobre descripción, fabricante y tipo
+        self.busqueda = MotorBusqueda(self.catalogo)
+
+    def _mascara_categoria(self, columna, valor):
+        categorias = self.filtros[columna].cat.categories
+        if valor not in categorias:
+            return np.zeros(len(self.filtros), dtype=bool)
+        return self.filtros[columna].cat.codes.to_numpy() == categorias.get_loc(valor)
+
+    def filtrar(self, tipo=None, fabricante=None, consulta=''):
+        """Filas del catálogo que cumplen los filtros; None significa sin filtro.
+
+        Con consulta, las filas salen ordenadas por relevancia de la búsqueda.
+        """
+        mascara = np.ones(len(self.filtros), dtype=bool)
+        if tipo is not None:
+            mascara &= self._mascara_categoria('Tipo', tipo)
+        if fabricante is not None:
+            mascara &= self._mascara_categoria('Fabricante', fabricante)
+        if consulta:
+            posiciones, _ = self.busqueda.buscar(consulta)
+            return self.catalogo.iloc[posiciones[mascara[posiciones]]]
+        return self.catalogo[mascara]